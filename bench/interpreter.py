@@ -0,0 +1,38 @@
+"""Compare the closure compiler against tree walking on the examples.
+
+python bench/interpreter.py
+"""
+import json
+from pathlib import Path
+import timeit
+
+from dnjs import html, interpreter
+
+examples = Path(__file__).parent.parent / "examples"
+comments = json.loads((examples / "comments.json").read_text()) * 500
+environment = json.loads((examples / "environment.json").read_text())
+
+cases = [
+    ("commentsPage.dn.js", (comments,)),
+    ("configuration.dn.js", (environment,)),
+]
+
+
+def bench(name, args, compiled, number):
+    module = interpreter.interpret(examples / name, compiled=compiled)
+    f = module.default_export
+    evaluate = timeit.timeit(lambda: html.make_value_js_friendly(f(*args)), number=number) / number
+    load = timeit.timeit(lambda: interpreter.interpret(examples / name, compiled=compiled), number=number) / number
+    return load, evaluate
+
+
+if __name__ == "__main__":
+    for name, args in cases:
+        walk_load, walk_eval = bench(name, args, False, 200)
+        comp_load, comp_eval = bench(name, args, True, 200)
+        print(
+            f"{name:<22} "
+            f"load {walk_load * 1e3:7.3f}ms -> {comp_load * 1e3:7.3f}ms   "
+            f"evaluate {walk_eval * 1e3:7.3f}ms -> {comp_eval * 1e3:7.3f}ms "
+            f"({walk_eval / comp_eval:.1f}x)"
+        )
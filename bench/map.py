@@ -0,0 +1,19 @@
+"""Time .map over a large array, with a ternary in the arrow function's body.
+
+python bench/map.py
+"""
+import timeit
+
+from dnjs import interpreter
+
+source = """
+export default (rows) => rows.map((row) => row.done === true ? [row.id, "done"] : {id: row.id})
+"""
+rows = [{"id": i, "done": i % 2 == 0} for i in range(100_000)]
+
+
+if __name__ == "__main__":
+    for compiled in [False, True]:
+        f = interpreter.interpret(source=source, compiled=compiled).default_export
+        seconds = timeit.timeit(lambda: f(rows), number=5) / 5
+        print(f"{'compiled' if compiled else 'tree walking':<12} {seconds * 1e3:7.1f}ms")
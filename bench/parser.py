@@ -0,0 +1,92 @@
+"""Time parsing a large generated module that isn't plain data, against the two pass checking it replaced.
+
+python bench/parser.py
+"""
+from contextlib import contextmanager
+import timeit
+from typing import Any, Iterator, Tuple
+
+from dnjs import parser, tokeniser
+from dnjs.parser import Node, ParseError
+
+template = """\
+const page{i} = (items, title) => m("div.page", {{id: "page-{i}"}},
+    m("h1", title === null ? "untitled" : `${{title}} {i}`),
+    m("ul", items.map(([k, v]) => m("li", {{class: k}}, v, [1, 2.5, true, "x"]))),
+    {{...items, key: [null, {{a: "b"}}]}},
+)
+"""
+source = "".join(template.format(i=i) for i in range(2000))
+
+
+def parse():
+    return list(parser.parse_statements(tokeniser.TokenStream.from_source(source)))
+
+
+def reference_convert_children(node: Node) -> Node:
+    """A copy of convert_children when it walked every statement after it was parsed."""
+    stack = [_zip_children_types(node)]
+    while stack:
+        for child, types in stack[-1]:
+            if child.token.type not in types:
+                raise ParseError(
+                    message=f"token is not of type: {' '.join(types)}",
+                    token=child.token,
+                )
+            if isinstance(types, dict):
+                child.token.type = types[child.token.type]
+            stack.append(_zip_children_types(child))
+            break
+        else:
+            stack.pop()
+    return node
+
+
+def _zip_children_types(node: Node) -> Iterator[Tuple[Node, Any]]:
+    ts = parser.children_types[node.token.type]
+    if ts and ts[-1] is ...:
+        ts = tuple(ts[0] for _ in node.children)
+    assert len(node.children) == len(ts)
+    return zip(node.children, ts)
+
+
+def _yield_descendants(node: Node) -> Iterator[Node]:
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children))
+
+
+@contextmanager
+def _unchecked_rules() -> Iterator[None]:
+    convert_children = parser.convert_children
+    parser.convert_children = lambda node: node
+    try:
+        yield
+    finally:
+        parser.convert_children = convert_children
+
+
+def reference_parse():
+    """parse_statements when each statement was checked, then scanned for its last line, after it was parsed."""
+    token_stream = tokeniser.TokenStream.from_source(source)
+    statements = []
+    with _unchecked_rules():
+        while token_stream.current.type != tokeniser.eof:
+            node = parser.parse(token_stream)
+            reference_convert_children(Node(parser._statement_token, [node]))
+            statements.append(node)
+            if token_stream.current.type == tokeniser.eof:
+                break
+            prev_lineno = max([c.token.lineno for c in _yield_descendants(node)])
+            if token_stream.current.lineno <= prev_lineno:
+                raise ParseError("expected statements to be on separate lines", token_stream.current)
+    return statements
+
+
+if __name__ == "__main__":
+    assert [str(s) for s in parse()] == [str(s) for s in reference_parse()]
+    for name, f in [("reference", reference_parse), ("parse", parse)]:
+        seconds = min(timeit.repeat(f, number=1, repeat=5))
+        print(f"{name:<10} {seconds * 1e3:6.1f}ms for {len(source.splitlines())} lines")
@@ -0,0 +1,24 @@
+"""Time chained .filter/.map calls over a large array and object.
+
+python bench/pipeline.py
+"""
+import timeit
+
+from dnjs import interpreter
+
+source = """
+export const count = (rows) => rows.filter((row) => row.done).map((row) => row.id).length
+export const ids = (rows) => rows.filter((row) => row.done).map((row) => row.id)
+export const includes = (rows) => rows.map((row) => row.id).includes(10)
+export const entries = (o) => Object.entries(o).map(([k, v]) => v)
+"""
+rows = [{"id": i, "done": i % 2 == 0} for i in range(100_000)]
+o = {str(i): i for i in range(100_000)}
+
+
+if __name__ == "__main__":
+    exports = interpreter.interpret(source=source).exports
+    for name, arg in [("count", rows), ("ids", rows), ("includes", rows), ("entries", o)]:
+        f = exports[name]
+        seconds = timeit.timeit(lambda: f(arg), number=5) / 5
+        print(f"{name:<9} {seconds * 1e3:7.1f}ms")
@@ -0,0 +1,19 @@
+"""Time the README's .reduce flatten idiom over a long list of lists.
+
+python bench/reduce.py
+"""
+import timeit
+
+from dnjs import interpreter
+
+source = """
+export default (rows) => rows.reduce((a, b) => [...a, ...b], [])
+"""
+rows = [[i, i + 1] for i in range(20_000)]
+
+
+if __name__ == "__main__":
+    for compiled in [False, True]:
+        f = interpreter.interpret(source=source, compiled=compiled).default_export
+        seconds = timeit.timeit(lambda: f(rows), number=1)
+        print(f"{'compiled' if compiled else 'tree walking':<12} {seconds * 1e3:7.1f}ms")
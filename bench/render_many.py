@@ -0,0 +1,29 @@
+"""Time rendering the comments page for many inputs with 1, 2, 4... workers.
+
+python bench/render_many.py
+"""
+import os
+from pathlib import Path
+import time
+
+from dnjs import render, render_many
+
+path = Path(__file__).parent.parent / "examples" / "commentsPage.dn.js"
+pages = [[{"text": f"comment {i} on page {page}"} for i in range(50)] for page in range(1000)]
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    for comments in pages:
+        render(path, comments)
+    serial = time.perf_counter() - start
+    print(f"render      {serial * 1e3:7.1f}ms")
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        start = time.perf_counter()
+        for _ in render_many(path, ((comments,) for comments in pages), workers=workers, chunksize=32):
+            pass
+        seconds = time.perf_counter() - start
+        print(f"workers={workers:<3} {seconds * 1e3:7.1f}ms {serial / seconds:5.2f}x")
+        workers *= 2
@@ -0,0 +1,31 @@
+"""Time rendering the comments page from 1, 2, 4... threads sharing one compiled template.
+
+Only a free-threaded build, eg: python3.13t, can scale past one core.
+
+python bench/threads.py
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import sys
+import time
+
+from dnjs import render
+
+path = Path(__file__).parent.parent / "examples" / "commentsPage.dn.js"
+pages = [[{"text": f"comment {i} on page {page}"} for i in range(50)] for page in range(1000)]
+
+
+if __name__ == "__main__":
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"gil={'enabled' if gil else 'disabled'}")
+    render(path, pages[0])
+    threads = 1
+    while threads <= (os.cpu_count() or 1):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            for _ in executor.map(lambda comments: render(path, comments), pages):
+                pass
+        seconds = time.perf_counter() - start
+        print(f"threads={threads:<3} {seconds * 1e3:7.1f}ms {len(pages) / seconds:7.0f} pages/s")
+        threads *= 2
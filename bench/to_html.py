@@ -0,0 +1,87 @@
+"""Time serializing a 10k node page with html.to_html against the serializer it replaced, and in compact mode.
+
+python bench/to_html.py
+"""
+from html import escape
+import timeit
+from typing import List, Tuple, Union
+
+from dnjs import builtins, html
+from dnjs.builtins import m
+
+SELF_CLOSING = html.SELF_CLOSING
+
+rows = [
+    m("tr.row", {"id": f"row-{i}", "data-index": i},
+        m("td.name", f"name {i} & co"),
+        m("td", m("a", {"href": f"/items/{i}", "title": "open"}, "open")),
+        m("td", m("input", {"type": "checkbox", "checked": i % 2 == 0, "disabled": False})),
+    )
+    for i in range(1250)
+]
+page = m("html", m("body", m("table.items", rows)))  # 10k nodes, counting text
+
+
+def reference_to_html(value: builtins.Value, indent: int = 0) -> str:
+    """A copy of to_html before it was optimized."""
+    out = []
+    stack: List[Union[Tuple[builtins.Value, int], str]] = [(value, indent)]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            out.append(item)
+            continue
+        value, indent = item
+        assert builtins.is_renderable(value)
+        if value is None:
+            continue
+        if isinstance(value, builtins.TrustedHtml):
+            out.append(("    " * indent) + value.string)
+            continue
+        if isinstance(value, str):
+            out.append(("    " * indent) + escape(value))
+            continue
+        if isinstance(value, (float, int)):
+            out.append(("    " * indent) + str(value))
+            continue
+        tag = value["tag"]
+        attrs = {**value["attrs"]}
+        children = value["children"]
+
+        attrs_str = ""
+        for k, v in attrs.items():
+            if k == "className":
+                k = "class"
+                if not v:
+                    continue
+            if v is None or v is False:
+                pass
+            elif v is True:
+                attrs_str += f' {escape(k)}'
+            elif isinstance(v, (float, int)):
+                attrs_str += f' {escape(k)}="{str(v)}"'
+            elif isinstance(v, str):
+                attrs_str += f' {escape(k)}="{escape(v)}"'
+            else:
+                raise RuntimeError(f"unable to convert type {type(v)}")
+
+        is_self_closing = tag in SELF_CLOSING and not children
+        if is_self_closing:
+            out.append(("    " * indent) + f"<{escape(tag)}{attrs_str}>\n")
+        elif tag in {"pre", "code", "textarea"}:
+            out.append(("    " * indent) + f"<{escape(tag)}{attrs_str}>")
+            stack.append(f"</{escape(tag)}>\n")
+            stack.extend((c, 0) for c in reversed(children))
+        else:
+            out.append(("    " * indent) + f"<{escape(tag)}{attrs_str}>\n")
+            stack.append("\n" + ("    " * indent) + f"</{escape(tag)}>\n")
+            stack.extend((c, indent + 1) for c in reversed(children))
+    return "".join(out)
+
+
+if __name__ == "__main__":
+    assert html.to_html(page) == reference_to_html(page)
+    compact = lambda page: html.to_html(page, compact=True)
+    for name, f in [("reference", reference_to_html), ("to_html", html.to_html), ("compact", compact)]:
+        seconds = min(timeit.repeat(lambda: f(page), number=5, repeat=5)) / 5
+        print(f"{name:<10} {seconds * 1e3:6.1f}ms {len(f(page).encode()):8} bytes")
@@ -1,13 +1,21 @@
+__version__ = "0.0.12"
+
+import asyncio
 from pathlib import Path
-from typing import Callable, Dict, Tuple, Union
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, Sequence, Union
 
 from dnjs import builtins, interpreter, html
 
 
 def get_default_export(path: Union[Path, str]) -> builtins.Value:
+    """The default export of path, as plain lists and dicts - modules are cached, so this is a copy."""
+    return builtins.thaw(_default_export(path))
+
+
+def _default_export(path: Union[Path, str]) -> builtins.Value:
     if not isinstance(path, Path):
         path = Path(path)
-    module = interpreter.interpret(path)
+    module = interpreter.load(path)
     if module.default_export is interpreter.missing and module.value is interpreter.missing:
         raise RuntimeError(f"{path} has no default export")
     if module.default_export is not interpreter.missing:
@@ -16,20 +24,59 @@ def get_default_export(path: Union[Path, str]) -> builtins.Value:
 
 
 def get_named_export(path: Union[Path, str], name: str) -> builtins.Value:
+    """Like get_default_export, for the export called name."""
     if not isinstance(path, Path):
         path = Path(path)
-    module = interpreter.interpret(path)
+    module = interpreter.load(path, lazy=True)  # only evaluate what name needs
     if name not in module.exports:
         raise RuntimeError(f"{name} not in {path} exports")
-    return module.exports[name]
+    return builtins.thaw(module.exports[name])
 
 
-def render(path: Union[Path, str], *values: builtins.Value) -> str:
+def render(path: Union[Path, str], *values: builtins.Value, compact: bool = False) -> str:
+    """The HTML of the default export of path called with values, with no whitespace between tags if compact."""
     if not isinstance(path, Path):
         path = Path(path)
 
-    values = tuple(html.make_value_js_friendly(v) for v in values)
-    f = get_default_export(path)
+    f = _default_export(path)
     assert isinstance(f, Callable)
+    return _render(f, values, compact)
+
+
+def _render(f: Callable, values: Sequence[builtins.Value], compact: bool = False) -> str:
+    return html.to_html(_evaluate(f, values), compact=compact)
+
+
+def _evaluate(f: Callable, values: Sequence[builtins.Value]) -> builtins.Value:
+    values = tuple(html.make_value_js_friendly(v) for v in values)
     html_tree = f(*values)
-    return html.to_html(html.make_value_js_friendly(html_tree))
+    return html.make_value_js_friendly(html_tree)
+
+
+async def render_async(
+    path: Union[Path, str], *values: builtins.Value, chunk_size: int = 1000, compact: bool = False
+) -> AsyncIterator[str]:
+    """Like render, but yields the HTML in chunks of about chunk_size tags, eg: for a streaming response.
+
+    The template is evaluated in the event loop's default executor, the loop gets
+    to run other tasks between each chunk.
+    """
+    if not isinstance(path, Path):
+        path = Path(path)
+
+    def evaluate() -> builtins.Value:
+        f = _default_export(path)
+        assert isinstance(f, Callable)
+        return _evaluate(f, values)
+
+    html_tree = await asyncio.get_running_loop().run_in_executor(None, evaluate)
+    for chunk in html.iter_html(html_tree, chunk_size=chunk_size, compact=compact):
+        yield chunk
+        await asyncio.sleep(0)
+
+
+def render_many(path: Union[Path, str], values: Iterable[Sequence[builtins.Value]], **kwargs: Any) -> Iterator[str]:
+    """render(path, *args) for each args in values over a process pool, see batch.render_many."""
+    from dnjs import batch
+
+    return batch.render_many(path, values, **kwargs)
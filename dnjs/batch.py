@@ -0,0 +1,69 @@
+"""Render a template for many inputs over a process pool.
+
+The template is loaded before the pool starts, so forked workers inherit the
+compiled module from interpreter.module_cache, spawned workers load it again -
+from the parse cache if it's enabled.
+"""
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice
+import os
+from pathlib import Path
+from typing import Callable, Deque, Iterable, Iterator, List, Optional, Sequence, Set, Union
+
+import dnjs
+from dnjs import builtins, cache
+
+_template: Optional[Callable] = None
+
+
+def _init(path: Path, cache_directory: Optional[Path], cache_enabled: bool) -> None:
+    global _template
+    if cache_enabled and cache.parse_cache is None:
+        cache.enable(cache_directory)
+    _template = dnjs._default_export(path)
+
+
+def _render_chunk(chunk: List[Sequence[builtins.Value]], compact: bool) -> List[str]:
+    return [dnjs._render(_template, values, compact) for values in chunk]
+
+
+def render_many(
+    path: Union[Path, str],
+    values: Iterable[Sequence[builtins.Value]],
+    workers: Optional[int] = None,
+    chunksize: int = 16,
+    ordered: bool = True,
+    compact: bool = False,
+) -> Iterator[str]:
+    """Yield the HTML for each args tuple in values, in order or as completed.
+
+    At most 2 * workers chunks are in flight, so values can be a long
+    running generator.
+    """
+    if not isinstance(path, Path):
+        path = Path(path)
+    workers = workers or os.cpu_count() or 1
+    assert isinstance(dnjs._default_export(path), Callable)  # fail early, and warm the cache for forked workers
+    parse_cache = cache.parse_cache
+    initargs = (path, parse_cache and parse_cache.directory, parse_cache is not None)
+    values = iter(values)
+    chunks = iter(lambda: list(islice(values, chunksize)), [])
+
+    with ProcessPoolExecutor(workers, initializer=_init, initargs=initargs) as executor:
+        submit = lambda chunk: executor.submit(_render_chunk, chunk, compact)
+        pending: Deque[Future] = deque(submit(c) for c in islice(chunks, 2 * workers))
+        if ordered:
+            while pending:
+                rendered = pending.popleft().result()
+                pending.extend(submit(c) for c in islice(chunks, 1))
+                yield from rendered
+        else:
+            running: Set[Future] = set(pending)
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                running |= {submit(c) for c in islice(chunks, len(done))}
+                for future in done:
+                    yield from future.result()
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 import codecs
-from dataclasses import dataclass, replace
+from collections import ChainMap
+from dataclasses import dataclass
 import functools
 import math
 import re
 import textwrap
-from typing import Any, Callable, Dict, List, Tuple, Union
+from typing import Any, Callable, Dict, List, MutableMapping, Optional, Tuple, Union
 
 from dnjs import parser
 
@@ -21,7 +22,7 @@ class Undefined:
 
 
 undefined = Undefined()
-Scope = Dict[str, Any]
+Scope = MutableMapping[str, Any]  # the module's dict, chained with a frame per function call
 Func = Callable[..., "Value"]
 Value = Union[dict, list, str, float, int, bool, None, Func, Undefined]
 
@@ -64,21 +65,23 @@ class From(Binary): ...
 
 def dnjs_function(scope: Scope, arg_names: List[str], value_node: p.Node, *args: Any) -> Callable:
     from dnjs import interpreter  # would be nice to move this
-    new_scope = dict(scope)
+    frame = {}
     for arg_name, arg in zip(arg_names, args):
         if isinstance(arg_name, list):
             for nested_arg_name, nested_arg in zip(arg_name, arg):
-                new_scope[nested_arg_name] = nested_arg
+                frame[nested_arg_name] = nested_arg
         else:
-            new_scope[arg_name] = arg
-    return interpreter.interpret_node(new_scope, replace(value_node, is_quoted=False))
+            frame[arg_name] = arg
+    # chain the args onto the enclosing scope rather than copying it
+    new_scope = scope.new_child(frame) if isinstance(scope, ChainMap) else ChainMap(frame, scope)
+    return interpreter.interpret_node(new_scope, value_node)
 
 
 def ternary(scope: Any, _: Any, predicate: bool, if_true_node: Node, if_false_node: Node) -> Any:
     from dnjs import interpreter  # would be nice to move this
     if predicate:
-        return interpreter.interpret_node(scope, replace(if_true_node, is_quoted=False))
-    return interpreter.interpret_node(scope, replace(if_false_node, is_quoted=False))
+        return interpreter.interpret_node(scope, if_true_node)
+    return interpreter.interpret_node(scope, if_false_node)
 
 
 def string(value: str) -> str:
@@ -87,35 +90,82 @@ def string(value: str) -> str:
 
 
 def name_handler(scope: Scope, node: p.Node):
-    if node.token.value not in scope:
-        raise InterpreterError(f"variable {node.token.value} is not in scope", node.token)
-    return scope[node.token.value]
+    try:
+        return scope[node.token.value]
+    except KeyError:
+        raise InterpreterError(f"variable {node.token.value} is not in scope", node.token) from None
 
 
 def dot_handler(_: Any, node: Node, value: Any, name: str) -> Any:
     if value is undefined:
         raise InterpreterError(f"cannot get .{name}, value is undefined", node.token)
 
+    if isinstance(value, dict):
+        return value.get(name, undefined)
+
     if isinstance(value, list):
+        method = list_methods.get(name)
+        if method is not None:
+            return functools.partial(method, value)
         if name == "length":
             return len(value)
-        if name == "map":
-            return lambda f: [f(v, i) for i, v in enumerate(value)]
-        if name == "filter":
-            return lambda f: [v for i, v in enumerate(value) if f(v, i)]
-        if name == "reduce":
-            return lambda f, initializer: functools.reduce(f, value, initializer)
-        if name == "includes":
-            return lambda v: v in value
 
-    if value is default_scope["m"]:
-        if name == "trust":
-            return m_dot_trust
+    if value is m and name == "trust":
+        return m_dot_trust
+
+    return undefined
+
+
+def find_method(type_: type, name: str) -> Optional[Callable[..., Any]]:
+    """The function to call as method(value, *args) for value.name(*args), if it only depends on type_."""
+    if issubclass(type_, list):
+        return list_methods.get(name)
+    return None
+
+
+def find_property(type_: type, name: str) -> Optional[Callable[[Any], Any]]:
+    """The function to call as prop(value) for value.name, if it only depends on type_."""
+    if issubclass(type_, dict):
+        return lambda value: value.get(name, undefined)
+    if issubclass(type_, list):
+        method = list_methods.get(name)
+        if method is not None:
+            return lambda value: functools.partial(method, value)
+        if name == "length":
+            return len
+        return lambda value: undefined
+    return None
+
+
+def reduce(f: Func, values: List[Any], initializer: Any) -> Any:
+    # compiled functions may know how to accumulate in place
+    if hasattr(f, "reduce"):
+        return f.reduce(values, initializer)
+    return functools.reduce(f, values, initializer)
+
+
+def list_map(value: List[Any], f: Func) -> List[Any]:
+    return [f(v, i) for i, v in enumerate(value)]
 
-    if not isinstance(value, dict):
-        return undefined
 
-    return value.get(name, undefined)
+def list_filter(value: List[Any], f: Func) -> List[Any]:
+    return [v for i, v in enumerate(value) if f(v, i)]
+
+
+def list_reduce(value: List[Any], f: Func, initializer: Any) -> Any:
+    return reduce(f, value, initializer)
+
+
+def list_includes(value: List[Any], v: Any) -> bool:
+    return v in value
+
+
+list_methods = {
+    "map": list_map,
+    "filter": list_filter,
+    "reduce": list_reduce,
+    "includes": list_includes,
+}
 
 
 def array_handler(_: Any, __: Any, *values: Iterator[Any]) -> List[Any]:
@@ -231,11 +281,102 @@ default_scope = {
 
 # other
 
+
+class FrozenList(list):
+    """A list shared between evaluations, eg: a constant folded by the compiler."""
+
+    def _frozen(self, *args: Any, **kwargs: Any) -> None:
+        raise TypeError(f"{type(self).__name__} is shared, copy it before changing it")
+
+    append = extend = insert = pop = remove = clear = sort = reverse = _frozen
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _frozen
+
+    def __reduce__(self) -> Any:
+        return list, (list(self),)
+
+
+class FrozenDict(dict):
+    """A dict shared between evaluations, eg: a constant folded by the compiler."""
+
+    def _frozen(self, *args: Any, **kwargs: Any) -> None:
+        raise TypeError(f"{type(self).__name__} is shared, copy it before changing it")
+
+    pop = popitem = clear = update = setdefault = _frozen
+    __setitem__ = __delitem__ = __ior__ = _frozen
+
+    def __reduce__(self) -> Any:
+        return dict, (dict(self),)
+
+
+class StaticNode(FrozenDict):
+    """A folded m(...) vnode, html.iter_html caches its HTML for each indent it's rendered at."""
+
+    __slots__ = ("rendered",)
+
+    def __init__(self, *args: Any) -> None:
+        super().__init__(*args)
+        self.rendered: Dict[Optional[int], str] = {}
+
+
+def freeze(value: Any) -> Any:
+    """Copy lists and dicts to their frozen versions, innermost first so nothing needs changing."""
+    order = []  # each list or dict comes before the lists and dicts inside it
+    stack = [value]
+    while stack:
+        o = stack.pop()
+        if isinstance(o, (FrozenList, FrozenDict)):
+            continue
+        if isinstance(o, list):
+            order.append(o)
+            stack.extend(o)
+        elif isinstance(o, dict):
+            order.append(o)
+            stack.extend(o.values())
+    frozen: Dict[int, Any] = {}
+    for o in reversed(order):
+        if isinstance(o, list):
+            frozen[id(o)] = FrozenList(frozen.get(id(v), v) for v in o)
+        else:
+            frozen[id(o)] = FrozenDict((k, frozen.get(id(v), v)) for k, v in o.items())
+    return frozen.get(id(value), value)
+
+
+def thaw(o: Any) -> Any:
+    """Copy o to plain lists and dicts for python callers, functions return thawed values too.
+
+    Modules, folded constants and memoized results are shared, this keeps a caller
+    changing what they're given from changing them.
+    """
+    root = [o]
+    stack = [(o, root, 0)]
+    while stack:
+        o, parent, key = stack.pop()
+        if isinstance(o, list):
+            out = parent[key] = list(o)
+            stack.extend((v, out, i) for i, v in enumerate(o))
+        elif isinstance(o, dict):
+            out = parent[key] = dict(o)
+            stack.extend((v, out, k) for k, v in o.items())
+        elif callable(o) and not isinstance(o, type):
+            parent[key] = _thawing(o)
+    return root[0]
+
+
+def _thawing(f: Callable[..., Any]) -> Callable[..., Any]:
+    return functools.wraps(f)(lambda *args: thaw(f(*args)))
+
+
 def undefineds_to_none(o: Any) -> Any:
-    if isinstance(o, list):
-        return [undefineds_to_none(v) for v in o]
-    if isinstance(o, dict):
-        return {k: undefineds_to_none(v) for k, v in o.items()}
-    if o is undefined:
-        return None
-    return o
+    root = [o]
+    stack = [(o, root, 0)]
+    while stack:
+        o, parent, key = stack.pop()
+        if isinstance(o, list):
+            out = parent[key] = list(o)
+            stack.extend((v, out, i) for i, v in enumerate(o))
+        elif isinstance(o, dict):
+            out = parent[key] = dict(o)
+            stack.extend((v, out, k) for k, v in o.items())
+        elif o is undefined:
+            parent[key] = None
+    return root[0]
@@ -0,0 +1,128 @@
+"""An opt-in on-disk cache of parsed statements, like __pycache__ for .dn.js files.
+
+Each source file gets one cache file holding a key - a hash of the source, the
+dnjs version and the cache and marshal formats - followed by the marshalled statements.
+"""
+from __future__ import annotations
+
+import hashlib
+import marshal
+import os
+import threading
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from dnjs import parser as p
+from dnjs import tokeniser as t
+
+CACHE_DIRNAME = "__dnjscache__"
+SUFFIX = ".dnjsc"
+
+# (type, value, pos, is_quoted, number of children) for each node in pre-order, flat
+# so neither serializing, deserializing nor marshal recurse on deeply nested nodes
+Serialized = Tuple[Tuple[str, str, int, bool, int], ...]
+FORMAT = 3
+
+
+def serialize(node: p.Node) -> Serialized:
+    out = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        token = node.token
+        out.append((token.type, token.value, token.pos, node.is_quoted, len(node.children)))
+        stack.extend(reversed(node.children))
+    return tuple(out)
+
+
+def deserialize(serialized: Serialized, source: t.Source) -> p.Node:
+    root = p.Node(t._void_token, [])
+    # each item is a node and how many more children it's waiting for
+    stack = [(root, 1)]
+    for type_, value, pos, is_quoted, n_children in serialized:
+        parent, waiting = stack.pop()
+        if waiting > 1:
+            stack.append((parent, waiting - 1))
+        node = p.Node(t.Token(type_, value, source, pos), [], is_quoted)
+        parent.children.append(node)
+        if n_children:
+            stack.append((node, n_children))
+    node, = root.children
+    return node
+
+
+def _key(source: str) -> bytes:
+    import dnjs
+
+    h = hashlib.sha256(f"{dnjs.__version__}:{FORMAT}:{marshal.version}:".encode())
+    h.update(source.encode("utf-8"))
+    return h.digest()
+
+
+class ParseCache:
+    """Caches the statements of files in directory, or next to each file if None."""
+
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = directory
+
+    def path_for(self, path: Path) -> Path:
+        path = path.resolve()
+        if self.directory is None:
+            return path.parent / CACHE_DIRNAME / (path.name + SUFFIX)
+        prefix = hashlib.sha1(str(path.parent).encode()).hexdigest()[:16]
+        return self.directory / f"{prefix}-{path.name}{SUFFIX}"
+
+    def parse(self, path: Path, source: Optional[str] = None) -> List[p.Node]:
+        """The statements of path, source is its already read and stripped text if given."""
+        if source is None:
+            source = path.read_text().rstrip()
+        key = _key(source)
+        cache_path = self.path_for(path)
+        try:
+            data = cache_path.read_bytes()
+        except OSError:
+            pass
+        else:
+            if data[:len(key)] == key:
+                try:
+                    shared = t.Source(source, path)
+                    return [deserialize(s, shared) for s in marshal.loads(data[len(key):])]
+                except (EOFError, ValueError, TypeError, IndexError):
+                    pass  # corrupt, fall through and rewrite it
+
+        statements = list(p.parse_statements(t.TokenStream(path, _text=source)))
+        self._write(cache_path, key + marshal.dumps(tuple(serialize(s) for s in statements)))
+        return statements
+
+    def warm(self, directory: Path) -> Iterator[Tuple[Path, Optional[p.ParseError]]]:
+        """Parse every .dn.js file below directory into the cache, yielding each path and its parse error if any."""
+        for path in sorted(directory.rglob("*.dn.js")):
+            try:
+                self.parse(path)
+            except p.ParseError as e:
+                yield path, e
+            else:
+                yield path, None
+
+    def _write(self, cache_path: Path, data: bytes) -> None:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, cache_path)
+        except OSError:
+            pass  # like __pycache__, a read-only tree just goes uncached
+
+
+parse_cache: Optional[ParseCache] = None
+
+
+def enable(directory: Optional[Path] = None) -> ParseCache:
+    global parse_cache
+    parse_cache = ParseCache(directory)
+    return parse_cache
+
+
+def disable() -> None:
+    global parse_cache
+    parse_cache = None
@@ -1,11 +1,13 @@
 import json
 from pathlib import Path
+import sys
 from typing import Any, Callable
 
 import click
 
 from dnjs import (
     builtins,
+    cache as dnjs_cache,
     css as dnjs_css,
     parser,
     interpreter,
@@ -20,6 +22,7 @@ to the evaluated dnjs if it is a function.
 """)
 @click.argument('filename', type=click.Path(exists=True, allow_dash=True))
 @click.option('--html', is_flag=True, help='Post process m(...) nodes to <html>.')
+@click.option('--compact', is_flag=True, help='With --html, leave out the whitespace between tags.')
 @click.option('--css', is_flag=True, help='Post process css')
 @click.option('--name', help='Pick an exported variable to return as opposed to the default.')
 @click.option('-p', '--process', help="Post-process the output with another dnjs function, eg: 'd=>d.value'.")
@@ -27,13 +30,32 @@ to the evaluated dnjs if it is a function.
 @click.option('--raw', is_flag=True, help='Print value as literal.')
 @click.option('--csv', is_flag=True, help='Print value as csv.')
 @click.option('--pdb', is_flag=True, help='Drop into the debugger on failure.')
-def main(filename, html, css, name, process, args, raw, csv, pdb):
+@click.option('--cache', is_flag=True, help=f'Cache parsed files in {dnjs_cache.CACHE_DIRNAME} directories next to them.')
+@click.option('--cache-dir', type=click.Path(file_okay=False), help='Cache parsed files in this directory.')
+@click.option('--warm-cache', is_flag=True, help='Parse every .dn.js file below the directory FILENAME into the cache.')
+def main(filename, html, compact, css, name, process, args, raw, csv, pdb, cache, cache_dir, warm_cache):
     tmp = None
+    if cache or cache_dir or warm_cache:
+        dnjs_cache.enable(Path(cache_dir) if cache_dir else None)
+    if warm_cache:
+        if not Path(filename).is_dir():
+            raise click.UsageError("--warm-cache expects FILENAME to be a directory")
+        failed = False
+        for path, error in dnjs_cache.parse_cache.warm(Path(filename)):
+            if error is None:
+                print(path)
+            else:
+                click.echo(error, err=True)
+                failed = True
+        if failed:
+            sys.exit(1)
+        return
     try:
+        # with --name, only evaluate the statements that export needs
         if filename == "-":
-            module = interpreter.interpret(source=click.get_text_stream('stdin').read())
+            module = interpreter.interpret(source=click.get_text_stream('stdin').read(), lazy=bool(name))
         else:
-            module = interpreter.interpret(path=Path(filename))
+            module = interpreter.interpret(path=Path(filename), lazy=bool(name))
         if name:
             if name not in module.exports:
                 raise RuntimeError(f"{name} not in {filename} exports")
@@ -61,7 +83,8 @@ def main(filename, html, css, name, process, args, raw, csv, pdb):
         if len([n for n in [html, css, process] if n]) > 1:
             raise RuntimeError('can only do 1 post-process at a time')
         if html:
-            return print(dnjs_html.to_html(value))
+            dnjs_html.write_html(value, sys.stdout, compact=compact)  # stream rather than build the whole page
+            return print()
         if css:
             return print(dnjs_css.to_css(value))
         if process:
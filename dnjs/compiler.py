@@ -0,0 +1,656 @@
+"""Compile parsed nodes into nested closures.
+
+A compiled node is a function of an env - a tuple of the module scope followed
+by one frame per enclosing arrow function. Names bound by arrow functions are
+resolved to a (depth, index) slot at compile time, everything else is looked
+up in the module scope when evaluated.
+
+Literals are decoded once, and nodes whose children are all constant are
+evaluated once at compile time, their value frozen and shared between calls.
+Folded vnodes are StaticNodes, so their HTML is only rendered once too.
+"""
+from __future__ import annotations
+
+from collections import ChainMap
+import functools
+import threading
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple, Union
+
+from dnjs import builtins
+from dnjs import memo
+from dnjs import parser as p
+from dnjs import tokeniser as t
+
+Env = Tuple[Any, ...]
+Compiled = Callable[[Env], Any]
+Frames = Tuple[Tuple[str, ...], ...]
+# the type of the accumulator and a body that extends it in place, see _compile_in_place
+InPlace = Tuple[type, Compiled]
+# whether it's a spread, its value and the token to blame if a spread is the wrong type
+Part = Tuple[bool, Compiled, Optional[t.Token]]
+
+
+class Unbound:
+    def __repr__(self):
+        return "<unbound>"
+
+
+unbound = Unbound()
+
+
+class Function:
+    """A dnjs arrow function, calling it binds the args to a new frame."""
+
+    __slots__ = ("arg_names", "_params", "_size", "_body", "_env", "_in_place")
+
+    def __init__(
+        self,
+        arg_names: List[Union[str, List[str]]],
+        params: List[Union[int, List[int]]],
+        size: int,
+        body: Compiled,
+        env: Env,
+        in_place: Optional[InPlace] = None,
+    ):
+        self.arg_names = arg_names
+        self._params = params
+        self._size = size
+        self._body = body
+        self._env = env
+        self._in_place = in_place
+
+    def __call__(self, *args: Any) -> Any:
+        function_cache = memo.function_cache
+        if function_cache is not None and len(self._env) == 1:  # only module level functions
+            return function_cache.call(self, args, lambda: self._body(self._env + (self._bind(args),)))
+        return self._body(self._env + (self._bind(args),))
+
+    def _bind(self, args: Tuple[Any, ...]) -> List[Any]:
+        frame = [unbound] * self._size
+        for param, arg in zip(self._params, args):
+            if isinstance(param, int):
+                frame[param] = arg
+            else:
+                for nested_param, nested_arg in zip(param, arg):
+                    frame[nested_param] = nested_arg
+        return frame
+
+    def reduce(self, values: List[Any], initializer: Any) -> Any:
+        """Like functools.reduce, but extending a copy of initializer in place if the body allows."""
+        if self._in_place is None or not isinstance(initializer, self._in_place[0]):
+            return functools.reduce(self, values, initializer)
+        type_, extend = self._in_place
+        acc = type_(initializer)
+        for value in values:
+            acc = extend(self._env + (self._bind((acc, value)),))
+        return acc
+
+    def __repr__(self) -> str:
+        return f"<Function ({', '.join(map(str, self.arg_names))})>"
+
+
+# how many nodes deep to compile to nested closures before walking the tree instead,
+# so neither compiling nor evaluating deeply nested nodes recurses past the recursion limit
+MAX_DEPTH = 64
+_compiling = threading.local()
+
+
+def compile_node(node: p.Node, frames: Frames = ()) -> Compiled:
+    depth = getattr(_compiling, "depth", 0)
+    if depth >= MAX_DEPTH:
+        return _compile_walked(node, frames)
+    _compiling.depth = depth + 1
+    try:
+        return compilers[node.token.type](node, frames)
+    finally:
+        _compiling.depth = depth
+
+
+def _compile_walked(node: p.Node, frames: Frames) -> Compiled:
+    """Evaluate node with interpret_node, binding each frame's names in a scope."""
+    from dnjs import interpreter
+
+    def walked(env: Env) -> Any:
+        scope = env[0]
+        for names, frame in zip(frames, env[1:]):
+            bound = {name: value for name, value in zip(names, frame) if value is not unbound}
+            scope = scope.new_child(bound) if isinstance(scope, ChainMap) else ChainMap(bound, scope)
+        return interpreter.interpret_node(scope, node)
+    return walked
+
+
+def _compile_children(node: p.Node, frames: Frames) -> List[Compiled]:
+    return [compile_node(c, frames) for c in node.children]
+
+
+def _constant(value: Any) -> Compiled:
+    def constant(env: Env) -> Any:
+        return value
+    constant.value = value
+    return constant
+
+
+def _guarded(value: Any, guards: FrozenSet[str], fallback: Compiled) -> Compiled:
+    """A constant that relies on the builtins named in guards not being shadowed."""
+    if not guards:
+        return _constant(value)
+    checks = [(name, builtins.default_scope[name]) for name in guards]
+
+    def guarded(env: Env) -> Any:
+        scope = env[0]
+        for name, builtin in checks:
+            if scope.get(name) is not builtin:
+                return fallback(env)
+        return value
+    guarded.value = value
+    guarded.guards = guards
+    return guarded
+
+
+def _is_constant(compiled: Compiled) -> bool:
+    return hasattr(compiled, "value")
+
+
+def _fold(compiled: Compiled, parts: List[Compiled]) -> Compiled:
+    """If every part is constant, evaluate compiled now and share its frozen value."""
+    if not all(_is_constant(part) for part in parts):
+        return compiled
+    try:
+        value = compiled((builtins.default_scope,))
+    except Exception:
+        return compiled  # leave it to raise when evaluated
+    guards = frozenset().union(*(getattr(part, "guards", ()) for part in parts))
+    value = builtins.freeze(value)
+    if builtins._is_vnode(value):
+        value = builtins.StaticNode(value)
+    return _guarded(value, guards, compiled)
+
+
+# atoms
+
+
+def compile_name(node: p.Node, frames: Frames) -> Compiled:
+    name = node.token.value
+
+    def global_(env: Env) -> Any:
+        try:
+            return env[0][name]
+        except KeyError:
+            raise builtins.InterpreterError(f"variable {name} is not in scope", node.token) from None
+    # innermost first, an unbound slot (a missing argument) falls through to the enclosing scopes
+    slots = [
+        (depth, len(names) - 1 - names[::-1].index(name))
+        for depth, names in reversed(list(enumerate(frames, 1)))
+        if name in names
+    ]
+    if slots:
+        return _compile_local(slots, global_)
+    if name in _foldable:
+        return _guarded(builtins.default_scope[name], frozenset([name]), global_)
+    return global_
+
+
+# builtins that always return the same value given the same args, so calls with constant args get folded
+_foldable = {"m", "dedent"}
+
+
+def _compile_local(slots: List[Tuple[int, int]], global_: Compiled) -> Compiled:
+    (depth, index), outer = slots[0], slots[1:]
+
+    def local(env: Env) -> Any:
+        value = env[depth][index]
+        if value is unbound:
+            for depth_, index_ in outer:
+                value = env[depth_][index_]
+                if value is not unbound:
+                    return value
+            return global_(env)
+        return value
+    return local
+
+
+def compile_d_name(node: p.Node, frames: Frames) -> Compiled:
+    return _constant(node.token.value)
+
+
+def compile_literal(node: p.Node, frames: Frames) -> Compiled:
+    return _constant({"null": None, "true": True, "false": False}[node.token.value])
+
+
+def compile_number(node: p.Node, frames: Frames) -> Compiled:
+    value = node.token.value
+    return _constant(float(value) if "." in value else int(value))
+
+
+def compile_string(node: p.Node, frames: Frames) -> Compiled:
+    return _constant(builtins.string(node.token.value))
+
+
+# operators
+
+
+def compile_paren(node: p.Node, frames: Frames) -> Compiled:
+    return compile_node(node.children[0], frames)
+
+
+def compile_pair(node: p.Node, frames: Frames) -> Compiled:
+    key, value = _compile_children(node, frames)
+    return _fold(lambda env: (key(env), value(env)), [key, value])
+
+
+def compile_equal(node: p.Node, frames: Frames) -> Compiled:
+    left, right = _compile_children(node, frames)
+    return _fold(lambda env: builtins.equal(None, None, left(env), right(env)), [left, right])
+
+
+def compile_dot(node: p.Node, frames: Frames) -> Compiled:
+    name = node.children[1].token.value
+    if name == "length":
+        source, applies = _split_pipeline(node.children[0])
+        if applies:
+            return _compile_length(node, source, applies, frames)
+    value = compile_node(node.children[0], frames)
+    dot_handler = builtins.dot_handler
+    cache: Dict[type, Callable[[Any], Any]] = {}  # an inline cache of how to get name by receiver type
+
+    def dot(env: Env) -> Any:
+        v = value(env)
+        prop = cache.get(type(v))
+        if prop is None:
+            prop = cache[type(v)] = builtins.find_property(type(v), name) or (lambda v: dot_handler(None, node, v, name))
+        return prop(v)
+    return dot
+
+
+def compile_apply(node: p.Node, frames: Frames) -> Compiled:
+    fused = _compile_fused(node, frames)
+    if fused is not None:
+        return fused
+    if node.children[0].token.type == ".":
+        return _compile_method_call(node, frames)
+    f = compile_node(node.children[0], frames)
+    args = _compile_children(node.children[1], frames)
+    return _fold(_compile_apply(f, args), [f, *args])
+
+
+def _compile_apply(f: Compiled, args: List[Compiled]) -> Compiled:
+    if not args:
+        return lambda env: f(env)()
+    if len(args) == 1:
+        a, = args
+        return lambda env: f(env)(a(env))
+    if len(args) == 2:
+        a, b = args
+        return lambda env: f(env)(a(env), b(env))
+    return lambda env: f(env)(*[a(env) for a in args])
+
+
+def _compile_method_call(node: p.Node, frames: Frames) -> Compiled:
+    """value.name(*args) without getting value.name first, if the receiver's type has a builtin method."""
+    dot = node.children[0]
+    name = dot.children[1].token.value
+    receiver = compile_node(dot.children[0], frames)
+    args = _compile_children(node.children[1], frames)
+    dot_handler = builtins.dot_handler
+    cache: Dict[type, Any] = {}  # an inline cache of the method by receiver type, False if there isn't one
+
+    def method_call(env: Env) -> Any:
+        value = receiver(env)
+        method = cache.get(type(value))
+        if method is None:
+            method = cache[type(value)] = builtins.find_method(type(value), name) or False
+        if method is False:
+            return dot_handler(None, dot, value, name)(*[a(env) for a in args])
+        return method(value, *[a(env) for a in args])
+
+    return method_call
+
+
+# pipelines
+
+
+def _split_pipeline(node: p.Node) -> Tuple[p.Node, List[p.Node]]:
+    """Split eg: xs.filter(f).map(g) into xs and the .filter(f) and .map(g) apply nodes."""
+    applies = []
+    while (
+        node.token.type == t.apply
+        and node.children[0].token.type == "."
+        and node.children[0].children[1].token.value in ("map", "filter")
+        and len(node.children[1].children) == 1
+    ):
+        applies.append(node)
+        node = node.children[0].children[0]
+    return node, applies[::-1]
+
+
+def _is_entries(node: p.Node) -> bool:
+    return (
+        node.token.type == t.apply
+        and node.children[0].token.type == "."
+        and node.children[0].children[1].token.value == "entries"
+        and len(node.children[1].children) == 1
+    )
+
+
+def _compile_fused(node: p.Node, frames: Frames) -> Optional[Compiled]:
+    """Fuse a chain of .map and .filter calls, ending in .includes, .reduce or neither."""
+    callee = node.children[0]
+    arity = {"includes": 1, "reduce": 2}
+    if callee.token.type == "." and arity.get(callee.children[1].token.value) == len(node.children[1].children):
+        source, applies = _split_pipeline(callee.children[0])
+        if applies:
+            return _compile_terminal(node, source, applies, frames)
+    # otherwise only fuse Object.entries, as list comprehensions one after the other beat chained generators
+    source, applies = _split_pipeline(node)
+    if applies and _is_entries(source):
+        pipeline = _compile_pipeline(source, applies, frames)
+
+        def to_list(env: Env) -> Any:
+            is_iterable, value = pipeline(env)
+            return list(value) if is_iterable else value
+        return to_list
+    return None
+
+
+def _compile_length(node: p.Node, source: p.Node, applies: List[p.Node], frames: Frames) -> Compiled:
+    pipeline = _compile_pipeline(source, applies, frames, count=True)
+
+    def length(env: Env) -> Any:
+        is_iterable, value = pipeline(env)
+        if is_iterable:
+            return len(value) if isinstance(value, list) else sum(1 for _ in value)
+        return builtins.dot_handler(None, node, value, "length")
+    return length
+
+
+def _compile_terminal(node: p.Node, source: p.Node, applies: List[p.Node], frames: Frames) -> Compiled:
+    dot = node.children[0]
+    name = dot.children[1].token.value
+    pipeline = _compile_pipeline(source, applies, frames)
+    args = _compile_children(node.children[1], frames)
+
+    def terminal(env: Env) -> Any:
+        is_iterable, value = pipeline(env)
+        if not is_iterable:
+            method = builtins.dot_handler(None, dot, value, name)
+            return method(*[a(env) for a in args])
+        if name == "includes":
+            return args[0](env) in value  # stops at the first match
+        return builtins.reduce(args[0](env), value, args[1](env))
+    return terminal
+
+
+def _compile_pipeline(source: p.Node, applies: List[p.Node], frames: Frames, count: bool = False) -> Callable[[Env], Tuple[bool, Any]]:
+    """Evaluates to (True, a lazy iterable) if source is a list, else (False, what the calls return one by one).
+
+    If count, maps after the last filter are skipped, as they can't change the length.
+    """
+    dots = [a.children[0] for a in applies]
+    stages = [(d.children[1].token.value == "map", compile_node(a.children[1].children[0], frames)) for d, a in zip(dots, applies)]
+    lazy_stages = stages
+    while count and lazy_stages and lazy_stages[-1][0]:
+        lazy_stages = lazy_stages[:-1]
+    source_ = _compile_source(source, frames)
+
+    def pipeline(env: Env) -> Tuple[bool, Any]:
+        is_iterable, value = source_(env)
+        if not is_iterable:
+            for dot, (is_map, f) in zip(dots, stages):
+                value = builtins.dot_handler(None, dot, value, "map" if is_map else "filter")(f(env))
+            return False, value
+        for is_map, f in lazy_stages:
+            value = _map(value, f(env)) if is_map else _filter(value, f(env))
+        return True, value
+    return pipeline
+
+
+def _compile_source(node: p.Node, frames: Frames) -> Callable[[Env], Tuple[bool, Any]]:
+    """Evaluates to (True, an iterable) if node is a list, or Object.entries of an object, else (False, its value)."""
+    if _is_entries(node):
+        callee = compile_node(node.children[0], frames)
+        arg = compile_node(node.children[1].children[0], frames)
+        entries = builtins.default_scope["Object"]["entries"]
+
+        def entries_source(env: Env) -> Tuple[bool, Any]:
+            f, o = callee(env), arg(env)
+            if f is entries and isinstance(o, dict):
+                return True, map(list, o.items())
+            value = f(o)
+            return isinstance(value, list), value
+        return entries_source
+
+    compiled = compile_node(node, frames)
+
+    def source(env: Env) -> Tuple[bool, Any]:
+        value = compiled(env)
+        return isinstance(value, list), value
+    return source
+
+
+def _map(values: Iterable[Any], f: Callable) -> Iterator[Any]:
+    return (f(v, i) for i, v in enumerate(values))
+
+
+def _filter(values: Iterable[Any], f: Callable) -> Iterator[Any]:
+    return (v for i, v in enumerate(values) if f(v, i))
+
+
+def compile_ternary(node: p.Node, frames: Frames) -> Compiled:
+    predicate, if_true, if_false = _compile_children(node, frames)
+    if _is_constant(predicate) and not hasattr(predicate, "guards"):
+        return if_true if predicate.value else if_false
+    return lambda env: if_true(env) if predicate(env) else if_false(env)
+
+
+def compile_arrow(node: p.Node, frames: Frames) -> Compiled:
+    arg_names: List[Union[str, List[str]]] = []
+    params: List[Union[int, List[int]]] = []
+    names: List[str] = []
+    for param in node.children[0].children:
+        if param.token.type == t.d_brack:
+            arg_names.append([c.token.value for c in param.children])
+            params.append(list(range(len(names), len(names) + len(param.children))))
+            names.extend(c.token.value for c in param.children)
+        else:
+            arg_names.append(param.token.value)
+            params.append(len(names))
+            names.append(param.token.value)
+    body = compile_node(node.children[1], frames + (tuple(names),))
+    in_place = _compile_in_place(node, frames + (tuple(names),))
+    size = len(names)
+    return lambda env: Function(arg_names, params, size, body, env, in_place)
+
+
+def _compile_in_place(node: p.Node, frames: Frames) -> Optional[InPlace]:
+    """For (acc, ...) => [...acc, ...] or {...acc, ...}, a body that extends acc rather than copying it.
+
+    Only if acc isn't used anywhere else in the body, so no one can see it change.
+    """
+    params, body = node.children
+    while body.token.type == "(":
+        body = body.children[0]
+    if not params.children or params.children[0].token.type == t.d_brack:
+        return None
+    if body.token.type not in ("[", "{") or not body.children:
+        return None
+    acc = params.children[0].token.value
+    first, *rest = body.children
+    if first.token.type != "..." or first.children[0].token.type != t.name or first.children[0].token.value != acc:
+        return None
+    stack = list(rest)
+    while stack:
+        n = stack.pop()
+        if n.token.type == t.name and n.token.value == acc:
+            return None
+        stack.extend(n.children)
+
+    parts = [_compile_part(c, frames) for c in rest]
+    depth = len(frames)  # acc is the first slot of the innermost frame
+    if body.token.type == "[":
+        extend = _array_extender(parts)
+        return list, lambda env: extend(env[depth][0], env)
+    update = _object_updater(parts)
+    return dict, lambda env: update(env[depth][0], env)
+
+
+def compile_array(node: p.Node, frames: Frames) -> Compiled:
+    if _is_literal(node):
+        return _constant(builtins.freeze(_build_literal(node)))
+    if not any(c.token.type == "..." for c in node.children):
+        values = _compile_children(node, frames)
+        return _fold(lambda env: [v(env) for v in values], values)
+
+    parts = [_compile_part(c, frames) for c in node.children]
+    extend = _array_extender(parts)
+    return _fold(lambda env: extend([], env), [value for _, value, _ in parts])
+
+
+def _array_extender(parts: List[Part]) -> Callable[[List[Any], Env], List[Any]]:
+    def extend(out: List[Any], env: Env) -> List[Any]:
+        for is_spread, value, token in parts:
+            if is_spread:
+                value = value(env)
+                if not isinstance(value, list):
+                    raise builtins.InterpreterError("must be of type: [", token)
+                out.extend(value)
+            else:
+                out.append(value(env))
+        return out
+    return extend
+
+
+def compile_object(node: p.Node, frames: Frames) -> Compiled:
+    if _is_literal(node):
+        return _constant(builtins.freeze(_build_literal(node)))
+    parts = [_compile_part(c, frames) for c in node.children]
+    update = _object_updater(parts)
+    return _fold(lambda env: update({}, env), [value for _, value, _ in parts])
+
+
+def _object_updater(parts: List[Part]) -> Callable[[dict, Env], dict]:
+    def update(out: dict, env: Env) -> dict:
+        for is_spread, value, token in parts:
+            if is_spread:
+                value = value(env)
+                if not isinstance(value, dict):
+                    raise builtins.InterpreterError("must be of type: {", token)
+                out.update(value)
+            else:
+                k, v = value(env)
+                out[k] = v
+        return out
+    return update
+
+
+_literal_types = {"[", "{", ":", t.number, t.string, t.literal, t.d_name}
+_atom_values = {
+    t.d_name: lambda value: value,
+    t.literal: {"null": None, "true": True, "false": False}.__getitem__,
+    t.number: lambda value: float(value) if "." in value else int(value),
+    t.string: builtins.string,
+}
+
+
+def _is_literal(node: p.Node) -> bool:
+    """Whether node is data, ie: made of only arrays, objects and literals."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.token.type not in _literal_types:
+            return False
+        stack.extend(node.children)
+    return True
+
+
+def _build_literal(node: p.Node) -> Any:
+    """Evaluate a literal node with an explicit stack, so deep data doesn't recurse."""
+    root = [None]
+    stack: List[Tuple[p.Node, Any, Any]] = [(node, root, 0)]
+    while stack:
+        node, parent, key = stack.pop()
+        type_ = node.token.type
+        if type_ == "[":
+            out = parent[key] = [None] * len(node.children)
+            stack.extend((c, out, i) for i, c in enumerate(node.children))
+        elif type_ == "{":
+            out = parent[key] = {}
+            pairs = [(_atom_values[c.children[0].token.type](c.children[0].token.value), c.children[1]) for c in node.children]
+            out.update((k, None) for k, _ in pairs)
+            # pushed in reverse so the last duplicate key is written last
+            stack.extend((value, out, k) for k, value in reversed(pairs))
+        else:
+            parent[key] = _atom_values[type_](node.token.value)
+    return root[0]
+
+
+def _compile_part(node: p.Node, frames: Frames) -> Part:
+    if node.token.type == "...":
+        return True, compile_node(node.children[0], frames), node.children[0].token
+    return False, compile_node(node, frames), None
+
+
+def compile_template(node: p.Node, frames: Frames) -> Compiled:
+    values = _compile_children(node, frames)
+    return _fold(lambda env: "".join(str(v(env)) for v in values), values)
+
+
+def compile_list(node: p.Node, frames: Frames) -> Compiled:
+    values = _compile_children(node, frames)
+    return lambda env: [v(env) for v in values]
+
+
+# statements
+
+
+def _compile_unary(cls: type) -> Callable[[p.Node, Frames], Compiled]:
+    def compile_unary(node: p.Node, frames: Frames) -> Compiled:
+        arg = compile_node(node.children[0], frames)
+        return lambda env: cls(None, node, arg(env))
+    return compile_unary
+
+
+def _compile_binary(cls: type) -> Callable[[p.Node, Frames], Compiled]:
+    def compile_binary(node: p.Node, frames: Frames) -> Compiled:
+        left, right = _compile_children(node, frames)
+        return lambda env: cls(None, node, left(env), right(env))
+    return compile_binary
+
+
+compilers = {
+    # atoms
+    t.name: compile_name,
+    t.d_name: compile_d_name,
+    t.literal: compile_literal,
+    t.number: compile_number,
+    t.string: compile_string,
+    t.template: compile_string,
+
+    # unary
+    "const": _compile_unary(builtins.Const),
+    "(": compile_paren,
+    "import": _compile_unary(builtins.Import),
+    "export": _compile_unary(builtins.Export),
+    "default": _compile_unary(builtins.Default),
+    "...": _compile_unary(builtins.Ellipsis_),
+
+    # binary
+    "=": _compile_binary(builtins.Assign),
+    "===": compile_equal,
+    ".": compile_dot,
+    "from": _compile_binary(builtins.From),
+    ":": compile_pair,
+    t.apply: compile_apply,
+
+    # ternary
+    "?": compile_ternary,
+
+    # variadic
+    "[": compile_array,
+    "{": compile_object,
+    "`": compile_template,
+    t.many: compile_list,
+    t.d_brack: compile_list,
+    t.d_brace: compile_list,
+    t.d_many: compile_list,
+    "=>": compile_arrow,
+}
@@ -0,0 +1,82 @@
+"""Decode modules that are only literal data with the json module.
+
+A module qualifies if each statement is a bare value, an `export default` or a
+`const`/`export const` of a value that is JSON give or take comments, trailing
+commas and unquoted keys. Anything else, or anything json would decode
+differently to dnjs - escapes, exponents, NaN - is left to the parser.
+"""
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+from dnjs import tokeniser as t
+
+# (kind, name, value) where kind is one of "value", "default", "const", "export"
+Statement = Tuple[str, Optional[str], Any]
+
+_string = r'"[^"\n]*"'
+_comments = re.compile(f"({_string})|//[^\\n]*")
+_trailing_commas = re.compile(f"({_string})|(?<=[\\]}}\"0-9a-z])(\\s*),(?=\\s*[\\]}}])")
+_maybe_trailing_comma = re.compile(r",\s*[\]}]")
+_keys = re.compile(f'"([^"\\n]*)"|(?<=[{{,])(\\s*)([_a-zA-Z][_a-zA-Z0-9]*)(?=\\s*:)')
+_reserved_keys = re.compile(f"[{{,]\\s*(?:{'|'.join([*t._keyword_values, *t._literal_values])})\\s*:")
+_statement = re.compile(r"\s*(?:(export\s+default)|(export\s+)?const\s+([_a-zA-Z][_a-zA-Z0-9]*)\s*=)?\s*")
+_line_end = re.compile(r"[ \t\r]*(?:\n|$)")
+_reserved = {*t._keyword_values, *t._literal_values}
+
+
+class _NotData(Exception):
+    pass
+
+
+def _float(s: str) -> float:
+    if "e" in s or "E" in s:
+        raise _NotData
+    return float(s)
+
+
+def _constant(s: str) -> Any:
+    raise _NotData
+
+
+_decoder = json.JSONDecoder(parse_float=_float, parse_constant=_constant)
+
+
+def statements(source: str) -> Optional[List[Statement]]:
+    if "\\" in source or "`" in source:
+        return None
+    if "//" in source:
+        source = _comments.sub(r"\1", source)
+    try:
+        return _statements(source)
+    except (_NotData, ValueError, RecursionError):
+        pass
+    if _reserved_keys.search(source):
+        return None
+    if _maybe_trailing_comma.search(source):
+        source = _trailing_commas.sub(r"\1\2", source)
+    source = _keys.sub(r'\2"\1\3"', source)
+    try:
+        return _statements(source)
+    except (_NotData, ValueError, RecursionError):
+        return None
+
+
+def _statements(source: str) -> Optional[List[Statement]]:
+    out: List[Statement] = []
+    pos = 0
+    while True:
+        header = _statement.match(source, pos)
+        if header.end() == len(source):
+            if header.group().strip():
+                return None  # a dangling `export default` or `const x =`
+            break
+        default, export, name = header.groups()
+        if name in _reserved:
+            return None
+        value, pos = _decoder.raw_decode(source, header.end())
+        if not _line_end.match(source, pos):
+            return None
+        kind = "default" if default else "export" if export else "const" if name else "value"
+        out.append((kind, name, value))
+    return out or None
@@ -1,7 +1,7 @@
 from dataclasses import asdict, is_dataclass
 from html import escape
 import re
-from typing import Any, Callable
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple, Union
 
 from dnjs import builtins
 
@@ -24,63 +24,162 @@ SELF_CLOSING = {
 
 
 def make_value_js_friendly(value: builtins.Value) -> builtins.Value:
-    if value is None or isinstance(value, (float, int, bool, str, builtins.TrustedHtml)):
-        return value
-    if isinstance(value, dict):
-        return {k: make_value_js_friendly(v) for k, v in value.items()}
-    if isinstance(value, (list, tuple)):
-        return [make_value_js_friendly(n) for n in value]
-    # we turn functions into null
-    if isinstance(value, Callable):
-        return None
-    if is_dataclass(value):
-        return make_value_js_friendly(asdict(value))
-    # handle pydantic without importing it
-    if hasattr(value, "dict") and callable(value.dict):
-        return make_value_js_friendly(value.dict())
-    raise RuntimeError(f"unable to make type jsonable {type(value)}")
-
-
-def to_html(value: builtins.Value, indent: int = 0) -> str:
-    assert builtins.is_renderable(value)
-    if value is None:
+    root = [value]
+    stack = [(value, root, 0)]
+    while stack:
+        value, parent, key = stack.pop()
+        if value is None or isinstance(value, (float, int, bool, str, builtins.TrustedHtml, builtins.StaticNode)):
+            parent[key] = value
+        elif isinstance(value, dict):
+            out = parent[key] = dict(value)
+            stack.extend((v, out, k) for k, v in value.items())
+        elif isinstance(value, (list, tuple)):
+            out = parent[key] = list(value)
+            stack.extend((v, out, i) for i, v in enumerate(value))
+        # we turn functions into null
+        elif isinstance(value, Callable):
+            parent[key] = None
+        elif is_dataclass(value):
+            stack.append((asdict(value), parent, key))
+        # handle pydantic without importing it
+        elif hasattr(value, "dict") and callable(value.dict):
+            stack.append((value.dict(), parent, key))
+        else:
+            raise RuntimeError(f"unable to make type jsonable {type(value)}")
+    return root[0]
+
+
+def to_html(value: builtins.Value, indent: int = 0, compact: bool = False) -> str:
+    return "".join(iter_html(value, indent, chunk_size=None, compact=compact))
+
+
+def write_html(
+    value: builtins.Value, file: TextIO, indent: int = 0, chunk_size: Optional[int] = 1000, compact: bool = False
+) -> None:
+    """Write the HTML of value to file as it's serialized, rather than building it all first."""
+    for chunk in iter_html(value, indent, chunk_size, compact):
+        file.write(chunk)
+
+
+def iter_html(
+    value: builtins.Value, indent: int = 0, chunk_size: Optional[int] = 1000, compact: bool = False
+) -> Iterator[str]:
+    """The HTML of value, in chunks of about chunk_size tags or text nodes, or all at once if None.
+
+    With compact=True, there's no whitespace between tags, except inside pre, code
+    and textarea tags, which are rendered as usual.
+    """
+    return _iter_html(value, None if compact else indent, chunk_size, static=True)
+
+
+def _iter_html(value: builtins.Value, indent: Optional[int], chunk_size: Optional[int], static: bool) -> Iterator[str]:
+    """See iter_html, an indent of None is compact, StaticNodes come from their cache if static."""
+    out: List[str] = []
+    # each item is either a value to render at an indent - None if compact - or a str to output as is
+    stack: List[Union[Tuple[builtins.Value, Optional[int]], str]] = [(value, indent)]
+    while stack:
+        if chunk_size is not None and len(out) >= chunk_size:
+            yield "".join(out)
+            out.clear()
+        item = stack.pop()
+        if type(item) is str:
+            out.append(item)
+            continue
+        value, indent = item
+        type_ = type(value)
+        if type_ is builtins.StaticNode and static:
+            out.append(_static_html(value, indent))
+            continue
+        if type_ is not str and type_ is not dict:
+            assert builtins.is_renderable(value)
+            if value is None:
+                continue
+            if isinstance(value, builtins.TrustedHtml):
+                out.append(_indent(indent) + value.string)
+                continue
+            if isinstance(value, str):
+                type_ = str
+            elif isinstance(value, (float, int)):
+                out.append(_indent(indent) + str(value))
+                continue
+        if type_ is str:
+            out.append(_indent(indent) + escape(value))
+            continue
+        # else is vnode
+        try:
+            tag = _name(value["tag"])
+            children = value["children"]
+            attrs = value["attrs"]
+        except KeyError:
+            assert builtins.is_renderable(value)
+            raise
+        attrs_str = _attrs(attrs) if attrs else ""
+
+        if indent is None:
+            out.append(f"<{tag}{attrs_str}>")
+            if children or tag not in SELF_CLOSING:
+                stack.append(f"</{tag}>")
+                inner = 0 if tag in _PRESERVE_WHITESPACE else None
+                stack.extend([(c, inner) for c in reversed(children)])
+        elif not children and tag in SELF_CLOSING:
+            out.append(f"{_indent(indent)}<{tag}{attrs_str}>\n")
+        elif tag in _PRESERVE_WHITESPACE:
+            out.append(f"{_indent(indent)}<{tag}{attrs_str}>")
+            stack.append(f"</{tag}>\n")
+            stack.extend([(c, 0) for c in reversed(children)])
+        else:
+            out.append(f"{_indent(indent)}<{tag}{attrs_str}>\n")
+            stack.append(f"\n{_indent(indent)}</{tag}>\n")
+            indent += 1
+            stack.extend([(c, indent) for c in reversed(children)])
+    if out:
+        yield "".join(out)
+
+
+def _static_html(node: builtins.StaticNode, indent: Optional[int]) -> str:
+    rendered = node.rendered.get(indent)
+    if rendered is None:
+        # StaticNodes inside node are rendered in place rather than recursing
+        rendered = node.rendered[indent] = "".join(_iter_html(node, indent, None, static=False))
+    return rendered
+
+
+_PRESERVE_WHITESPACE = {"pre", "code", "textarea"}
+_INDENTS = tuple("    " * i for i in range(64))
+
+
+def _indent(depth: Optional[int]) -> str:
+    if depth is None:
         return ""
-    if isinstance(value, builtins.TrustedHtml):
-        return ("    " * indent) + value.string
-    if isinstance(value, str):
-        return ("    " * indent) + escape(value)
-    if isinstance(value, (float, int)):
-        return ("    " * indent) + str(value)
-    # else is vnode
-    tag = value["tag"]
-    attrs = {**value["attrs"]}
-    children = value["children"]
-
-    attrs_str = ""
+    return _INDENTS[depth] if depth < 64 else "    " * depth
+
+
+_safe_name = re.compile(r"[a-zA-Z][a-zA-Z0-9_:.\-]*\Z").match
+# escaped tag and attribute names, bounded as names could come from user data
+_names: Dict[str, str] = {}
+
+
+def _name(name: str) -> str:
+    out = _names.get(name)
+    if out is None:
+        out = name if _safe_name(name) else escape(name)
+        if len(_names) < 4096:
+            _names[name] = out
+    return out
+
+
+def _attrs(attrs: Dict[str, Any]) -> str:
+    out = []
     for k, v in attrs.items():
-        if k == "className":
-            k = "class"
-            if not v:
-                continue
-        if v is None or v is False:
-            pass
+        if v is None or v is False or (not v and k == "className"):
+            continue
+        name = "class" if k == "className" else _name(k)
+        if type(v) is str or isinstance(v, str):
+            out.append(f' {name}="{escape(v)}"')
         elif v is True:
-            attrs_str += f' {escape(k)}'
+            out.append(f" {name}")
         elif isinstance(v, (float, int)):
-            attrs_str += f' {escape(k)}="{str(v)}"'
-        elif isinstance(v, str):
-            attrs_str += f' {escape(k)}="{escape(v)}"'
+            out.append(f' {name}="{v}"')
         else:
             raise RuntimeError(f"unable to convert type {type(v)}")
-
-    is_self_closing = tag in SELF_CLOSING and not children
-    html_str = ("    " * indent) + f"<{escape(tag)}{attrs_str}>\n"
-    if not is_self_closing:
-        if tag in {"pre", "code", "textarea"}:
-            html_str = html_str[:-1]  # strip \n
-            html_str += "".join(to_html(c, 0) for c in children)
-            html_str += f"</{escape(tag)}>\n"
-        else:
-            html_str += "".join(to_html(c, indent + 1) for c in children) + "\n"
-            html_str += ("    " * indent) + f"</{escape(tag)}>\n"
-    return html_str
+    return "".join(out)
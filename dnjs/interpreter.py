@@ -1,12 +1,18 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, replace
-from functools import partial
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from functools import lru_cache, partial
+import hashlib
 import math
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set, Tuple, Union, Iterator
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union, Iterator
 
 from dnjs import builtins
+from dnjs import cache
+from dnjs import compiler
+from dnjs import data
 from dnjs import parser as p
 from dnjs import tokeniser as t
 
@@ -26,6 +32,97 @@ class Module:
     exports: Dict[str, builtins.Value]
     default_export: Union[Missing, builtins.Value]
     value: Union[Missing, builtins.Value]
+    imports: List[Path] = field(default_factory=list)
+
+
+class LazyModule(Module):
+    """A module whose statements are evaluated when what they bind is first looked up."""
+
+    @property
+    def default_export(self) -> Union[Missing, builtins.Value]:
+        return _force(self._default_export)
+
+    @default_export.setter
+    def default_export(self, value: Union[Missing, builtins.Value, _Binding]) -> None:
+        self._default_export = value
+
+    @property
+    def value(self) -> Union[Missing, builtins.Value]:
+        return _force(self._value)
+
+    @value.setter
+    def value(self, value: Union[Missing, builtins.Value, _Binding]) -> None:
+        self._value = value
+
+
+class _Binding:
+    """The value of a statement, evaluated once, when first needed."""
+
+    __slots__ = ("index", "evaluate", "previous", "horizon", "lock", "value")
+
+    def __init__(self, index: int, evaluate: Callable[[], Any], previous: Any, scope: LazyScope):
+        self.index = index
+        self.evaluate = evaluate
+        self.previous = previous  # what the name was bound to before this statement
+        self.horizon = scope.horizon
+        self.lock = scope.lock
+        self.value = missing
+
+    def get(self) -> Any:
+        if self.value is missing:
+            with self.lock:
+                if self.value is missing:
+                    stack = self.horizon.stack
+                    stack.append(self.index)
+                    try:
+                        self.value = self.evaluate()
+                    finally:
+                        stack.pop()
+        return self.value
+
+
+def _force(value: Any) -> Any:
+    return value.get() if isinstance(value, _Binding) else value
+
+
+class _Horizon(threading.local):
+    def __init__(self):
+        self.stack: List[float] = [math.inf]
+
+
+class LazyScope(dict):
+    """The scope of a LazyModule, its bindings are evaluated on first lookup.
+
+    While a statement is evaluated, as when evaluating each in turn, only the
+    names bound by the statements before it are in scope - horizon is a per thread
+    stack of the indexes of the statements being evaluated. Bindings are evaluated
+    holding lock, so each is evaluated once when shared between threads.
+    """
+
+    def __init__(self, *args: Any, shared_with: Optional[LazyScope] = None):
+        super().__init__(*args)
+        self.horizon = _Horizon() if shared_with is None else shared_with.horizon
+        self.lock = threading.RLock() if shared_with is None else shared_with.lock
+
+    def __getitem__(self, name: str) -> Any:
+        value = dict.__getitem__(self, name)
+        while isinstance(value, _Binding):
+            if value.index < self.horizon.stack[-1]:
+                return value.get()
+            value = value.previous
+        if value is missing:
+            raise KeyError(name)
+        return value
+
+    def bind(self, name: str, index: int, evaluate: Callable[[], Any]) -> _Binding:
+        binding = _Binding(index, evaluate, dict.get(self, name, missing), self)
+        dict.__setitem__(self, name, binding)
+        return binding
+
+
+# literals are decoded once rather than every time they're evaluated
+_number = lru_cache(maxsize=4096)(lambda value: float(value) if "." in value else int(value))
+_string = lru_cache(maxsize=4096)(builtins.string)
 
 
 handlers = {
@@ -33,9 +130,9 @@ handlers = {
     t.name: builtins.name_handler,
     t.d_name: lambda _, n: n.token.value,
     t.literal: lambda _, n: {"null": None, "true": True, "false": False}[n.token.value],
-    t.number: lambda _, n: float(n.token.value) if "." in n.token.value else int(n.token.value),
-    t.string: lambda _, n: builtins.string(n.token.value),
-    t.template: lambda _, n: builtins.string(n.token.value),
+    t.number: lambda _, n: _number(n.token.value),
+    t.string: lambda _, n: _string(n.token.value),
+    t.template: lambda _, n: _string(n.token.value),
 
     # unary
     "const": builtins.Const,
@@ -69,27 +166,98 @@ handlers = {
 
 
 def interpret_node(scope: builtins.Scope, node: p.Node):
-    if node.is_quoted:
-        return node
-    args = [interpret_node(scope, c) for c in node.children]
-    out = handlers[node.token.type](scope, node, *args)
-    return out
+    """Evaluate node, even if quoted - its quoted children are passed to handlers as is."""
+    # each item is a node and the values of the children evaluated so far
+    stack: List[Tuple[p.Node, List[Any]]] = [(node, [])]
+    while True:
+        node, args = stack[-1]
+        if len(args) < len(node.children):
+            child = node.children[len(args)]
+            if child.is_quoted:
+                args.append(child)
+            else:
+                stack.append((child, []))
+            continue
+        stack.pop()
+        out = handlers[node.token.type](scope, node, *args)
+        if not stack:
+            return out
+        stack[-1][1].append(out)
+
+
+class Loader:
+    """Loads each module of an import graph once, refusing circular imports."""
+
+    def __init__(self, module_cache: Optional[ModuleCache] = None, compiled: bool = True, lazy: bool = False):
+        self.module_cache = module_cache
+        self.compiled = compiled
+        self.lazy = lazy
+        self.modules: Dict[Path, Module] = {}
+        self.stack: List[Path] = []
 
+    def load(self, path: Path, token: t.Token = t._void_token) -> Module:
+        resolved = path.resolve()
+        if resolved in self.stack:
+            cycle = self.stack[self.stack.index(resolved):] + [resolved]
+            raise p.ParseError(f"circular import: {' -> '.join(c.name for c in cycle)}", token)
+        if resolved not in self.modules:
+            self.stack.append(resolved)
+            try:
+                if self.module_cache is None:
+                    module = interpret(path, compiled=self.compiled, lazy=self.lazy, loader=self)
+                else:
+                    module = self.module_cache._get(resolved, self)
+            finally:
+                self.stack.pop()
+            self.modules[resolved] = module
+        return self.modules[resolved]
 
-def interpret(path: Optional[Path] = None, source: Optional[str] = None) -> Module:
+
+def interpret(
+    path: Optional[Path] = None,
+    source: Optional[str] = None,
+    compiled: bool = True,
+    loader: Optional[Loader] = None,
+    lazy: bool = False,
+) -> Module:
+    """Evaluate each statement of a module in turn.
+
+    With compiled=False, statements are evaluated by walking the tree with
+    interpret_node rather than being compiled to closures first. Imports go
+    through loader, so each module in the import graph is evaluated once.
+
+    With lazy=True, imported files are still loaded up front, but each statement
+    is only evaluated when a name it binds, or the default export, is needed.
+    """
+    if loader is None:
+        loader = Loader(compiled=compiled, lazy=lazy)
+        if path is not None:
+            return loader.load(path)
+    text = (source if path is None else path.read_text()).rstrip()
+    data_statements = data.statements(text)
+    if data_statements is not None:
+        return _data_module(path, data_statements)
     if path is None:
-        token_stream = t.TokenStream.from_source(source)
+        statements = p.parse_statements(t.TokenStream.from_source(source))
+    elif cache.parse_cache is not None:
+        statements = cache.parse_cache.parse(path, text)
     else:
-        token_stream = t.TokenStream(path)
+        statements = p.parse_statements(t.TokenStream(path, _text=text))
+    if lazy:
+        return _lazy_module(path, statements, compiled, loader)
     module = Module(
-        path=token_stream.filepath,
+        path=path,
         scope=dict(builtins.default_scope),
         exports={},
         default_export=missing,
         value=missing,
     )
-    for statement_node in p.parse_statements(token_stream):
-        statement = interpret_node(module.scope, statement_node)
+    env = (module.scope,)
+    for statement_node in statements:
+        if compiled:
+            statement = compiler.compile_node(statement_node)(env)
+        else:
+            statement = interpret_node(module.scope, statement_node)
 
         if isinstance(statement, builtins.Const):
             name, value = statement.arg.left, statement.arg.right
@@ -100,12 +268,14 @@ def interpret(path: Optional[Path] = None, source: Optional[str] = None) -> Modu
             if not from_path.startswith("."):
                 continue
             if not from_path.endswith(".dn.js"):
-                raise p.ParseError("can only import files ending .dn.js", statement.token)
-            imported_module = interpret(module.path.parent / Path(from_path))
+                raise p.ParseError("can only import files ending .dn.js", statement.node.token)
+            import_path = module.path.parent / Path(from_path)
+            imported_module = loader.load(import_path, statement.node.token)
+            module.imports.append(import_path.resolve())
 
             if isinstance(names, str):
                 if imported_module.default_export is missing:
-                    raise p.ParseError(f"{imported_module.path} missing export default", statement.token)
+                    raise p.ParseError(f"{imported_module.path} missing export default", statement.node.token)
                 module.scope[names] = imported_module.default_export
             elif isinstance(names, list):
                 for name in names:
@@ -125,3 +295,211 @@ def interpret(path: Optional[Path] = None, source: Optional[str] = None) -> Modu
             module.value = statement
 
     return module
+
+
+def _lazy_module(path: Optional[Path], statements: Iterator[p.Node], compiled: bool, loader: Loader) -> LazyModule:
+    scope = LazyScope(builtins.default_scope)
+    exports = LazyScope(shared_with=scope)
+    module = LazyModule(path=path, scope=scope, exports=exports, default_export=missing, value=missing)
+    env = (scope,)
+
+    def evaluator(node: p.Node) -> Callable[[], Any]:
+        if compiled:
+            return lambda: compiler.compile_node(node)(env)
+        return lambda: interpret_node(scope, node)
+
+    for index, node in enumerate(statements):
+        type_ = node.token.type
+        if type_ == "import":
+            names, from_path = node.children[0].children
+            from_path = builtins.string(from_path.token.value)
+            if not from_path.startswith("."):
+                continue
+            if not from_path.endswith(".dn.js"):
+                raise p.ParseError("can only import files ending .dn.js", node.token)
+            import_path = module.path.parent / Path(from_path)
+            imported_module = loader.load(import_path, node.token)
+            module.imports.append(import_path.resolve())
+            if names.token.type == t.d_name:
+                scope.bind(names.token.value, index, partial(_default_import, imported_module, node.token))
+            else:
+                for name in names.children:
+                    scope.bind(name.token.value, index, partial(_named_import, imported_module, name.token))
+
+        elif type_ == "const":
+            name, value = node.children[0].children
+            scope.bind(name.token.value, index, evaluator(value))
+
+        elif type_ == "export" and node.children[0].token.type == "const":
+            name, value = node.children[0].children[0].children
+            binding = scope.bind(name.token.value, index, evaluator(value))
+            dict.__setitem__(exports, name.token.value, binding)
+
+        elif type_ == "export":  # export default
+            module.default_export = _Binding(index, evaluator(node.children[0].children[0]), missing, scope)
+
+        else:
+            module.value = _Binding(index, evaluator(node), missing, scope)
+
+    return module
+
+
+def _default_import(module: Module, token: t.Token) -> builtins.Value:
+    if module.default_export is missing:
+        raise p.ParseError(f"{module.path} missing export default", token)
+    return module.default_export
+
+
+def _named_import(module: Module, token: t.Token) -> builtins.Value:
+    if token.value not in module.exports:
+        raise p.ParseError(f"{token.value} not in {module.path} exports", token)
+    return module.exports[token.value]
+
+
+def _data_module(path: Optional[Path], statements: List[data.Statement]) -> Module:
+    module = Module(path=path, scope=dict(builtins.default_scope), exports={}, default_export=missing, value=missing)
+    for kind, name, value in statements:
+        if kind == "value":
+            module.value = value
+        elif kind == "default":
+            module.default_export = value
+        else:
+            module.scope[name] = value
+            if kind == "export":
+                module.exports[name] = value
+    return module
+
+
+@dataclass
+class _CacheEntry:
+    module: Module
+    mtime_ns: int
+    size: int
+    digest: str
+
+
+def _stat(path: Path) -> Tuple[int, int]:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _digest(path: Path) -> str:
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+class ModuleCache:
+    """Interpreted modules keyed on resolved path.
+
+    An entry is reused while its file and every file it imports are unchanged,
+    a file counts as changed if its mtime/size moved and its content hash
+    differs. Stale modules are evicted along with everything importing them.
+
+    It's safe to share between threads. The lock is only held to look up and
+    insert entries, a module is loaded by one thread while others needing that
+    same path wait for it - unless they're what it's waiting for, in which case
+    they load it too and hit the circular import.
+    """
+
+    def __init__(self, maxsize: int = 256, lazy: bool = False):
+        self.maxsize = maxsize
+        self.lazy = lazy
+        self._entries: OrderedDict[Path, _CacheEntry] = OrderedDict()
+        self._lock = threading.RLock()
+        self._loaded = threading.Condition(self._lock)
+        self._loading: Dict[Path, int] = {}  # path -> id of the thread loading it
+        self._waiting: Dict[int, int] = {}  # thread id -> id of the thread it's waiting for
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, path: Path) -> bool:
+        return path.resolve() in self._entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, path: Path) -> Module:
+        return Loader(self, lazy=self.lazy).load(path)
+
+    def _get(self, path: Path, loader: Loader) -> Module:
+        me = threading.get_ident()
+        with self._lock:
+            while True:
+                if path in self._entries and self._is_fresh(path, set()):
+                    self._entries.move_to_end(path)
+                    return self._entries[path].module
+                owner = self._loading.get(path)
+                if owner is None or self._waits_for(owner, me):
+                    break
+                self._waiting[me] = owner
+                try:
+                    self._loaded.wait()
+                finally:
+                    del self._waiting[me]
+            self._evict(path)
+            self._loading.setdefault(path, me)
+
+        entry = None
+        try:
+            mtime_ns, size = _stat(path)
+            digest = _digest(path)
+            module = interpret(path, compiled=loader.compiled, lazy=loader.lazy, loader=loader)
+            entry = _CacheEntry(module, mtime_ns, size, digest)
+        finally:
+            with self._lock:
+                if entry is not None:
+                    self._entries[path] = entry
+                    while len(self._entries) > self.maxsize:
+                        self._evict(next(iter(self._entries)))
+                if self._loading.get(path) == me:
+                    del self._loading[path]
+                self._loaded.notify_all()
+        return module
+
+    def _waits_for(self, thread: Optional[int], other: int) -> bool:
+        """Whether thread is, transitively, waiting for other."""
+        while thread is not None:
+            if thread == other:
+                return True
+            thread = self._waiting.get(thread)
+        return False
+
+    def evict(self, path: Path) -> None:
+        """Remove path and, transitively, every cached module that imports it."""
+        with self._lock:
+            self._evict(path)
+
+    def _evict(self, path: Path) -> None:
+        to_evict = [path.resolve()]
+        while to_evict:
+            path = to_evict.pop()
+            if self._entries.pop(path, None) is None:
+                continue
+            to_evict.extend(p for p, e in self._entries.items() if path in e.module.imports)
+
+    def _is_fresh(self, path: Path, seen: Set[Path]) -> bool:
+        if path in seen:
+            return True
+        seen.add(path)
+        entry = self._entries.get(path)
+        if entry is None:
+            return False
+        try:
+            mtime_ns, size = _stat(path)
+            if (mtime_ns, size) != (entry.mtime_ns, entry.size):
+                if size != entry.size or _digest(path) != entry.digest:
+                    return False
+                entry.mtime_ns = mtime_ns
+        except OSError:
+            return False
+        return all(self._is_fresh(p, seen) for p in entry.module.imports)
+
+
+module_cache = ModuleCache()
+lazy_module_cache = ModuleCache(lazy=True)
+
+
+def load(path: Path, lazy: bool = False) -> Module:
+    """Like interpret(path), but reuses unchanged modules from module_cache, or lazy_module_cache."""
+    return (lazy_module_cache if lazy else module_cache).get(path)
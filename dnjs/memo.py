@@ -0,0 +1,144 @@
+"""An opt-in cache of what module level dnjs functions return, keyed on the structure of their args.
+
+dnjs functions are pure, so a component called again with equal args, eg: a
+nav bar on every page, can return the same value. Values are frozen as they're
+shared, see builtins.freeze.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import sys
+import threading
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from dnjs import builtins
+
+_scalars = {str, int, float, bool, type(None)}
+
+
+@dataclass
+class CacheInfo:
+    hits: int
+    misses: int
+    entries: int
+    bytes: int
+
+
+def structural_key(values: Tuple[Any, ...]) -> Optional[Hashable]:
+    """A key equal for values that are equal and of the same types, or None if a value isn't hashable.
+
+    Values are flattened in order with the types and lengths of lists and dicts,
+    so 1, 1.0 and true or {a, b} and {b, a} get different keys.
+    """
+    out = []
+    stack = [values]
+    while stack:
+        value = stack.pop()
+        type_ = type(value)
+        if type_ in _scalars:
+            out.append(type_)
+            out.append(value)
+        elif isinstance(value, (list, tuple)):
+            out.append(list)
+            out.append(len(value))
+            stack.extend(reversed(value))
+        elif isinstance(value, dict):
+            out.append(dict)
+            out.append(len(value))
+            for k, v in reversed(value.items()):
+                stack.append(v)
+                stack.append(k)
+        elif type_ is builtins.TrustedHtml:
+            out.append(type_)
+            out.append(value.string)
+        else:  # functions and undefined are compared by identity
+            try:
+                hash(value)
+            except TypeError:
+                return None
+            out.append(value)
+    return tuple(out)
+
+
+def sizeof(value: Any) -> int:
+    """Roughly how many bytes value takes up, counting shared values each time they appear."""
+    size = 0
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        size += sys.getsizeof(value)
+        if isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, dict):
+            stack.extend(value.keys())
+            stack.extend(value.values())
+    return size
+
+
+class FunctionCache:
+    """Least recently used results, bounded by both the number of entries and their size in bytes.
+
+    Safe to share between threads, though two threads missing on the same key both evaluate it.
+    """
+
+    def __init__(self, maxsize: int = 1024, maxbytes: int = 64 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries: OrderedDict[Hashable, Tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def call(self, f: Callable, args: Tuple[Any, ...], evaluate: Callable[[], Any]) -> Any:
+        args_key = structural_key(args)
+        if args_key is None:
+            return evaluate()
+        key = (f, args_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[0]
+            self.misses += 1
+
+        value = builtins.freeze(evaluate())
+        size = sizeof(value)
+        if size > self.maxbytes:
+            return value
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (value, size)
+                self.bytes += size
+            while len(self._entries) > self.maxsize or self.bytes > self.maxbytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+            return self._entries[key][0] if key in self._entries else value
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, len(self._entries), self.bytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+function_cache: Optional[FunctionCache] = None
+
+
+def enable(maxsize: int = 1024, maxbytes: int = 64 * 1024 * 1024) -> FunctionCache:
+    global function_cache
+    function_cache = FunctionCache(maxsize, maxbytes)
+    return function_cache
+
+
+def disable() -> None:
+    global function_cache
+    function_cache = None
@@ -1,20 +1,29 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field, replace
-from pathlib import Path
+from dataclasses import dataclass, field
 from textwrap import dedent
-from typing import Callable, Dict, Iterator, Optional, List, Set, Tuple
+from typing import Any, Callable, Dict, Generator, Iterator, Optional, List, Set, Tuple, Union
 
 import dnjs.tokeniser as t
 
 LOW_PREC, COLON_PREC, HIGH_PREC = 1, 2, 999
 
 
-@dataclass
 class Node:
-    token: t.Token
-    children: List[Node]
-    is_quoted: bool = False
+    __slots__ = ("token", "children", "is_quoted")
+
+    def __init__(self, token: t.Token, children: List[Node], is_quoted: bool = False):
+        self.token = token
+        self.children = children
+        self.is_quoted = is_quoted
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Node):
+            return NotImplemented
+        return (self.token, self.children, self.is_quoted) == (other.token, other.children, other.is_quoted)
+
+    def __repr__(self) -> str:
+        return f"Node(token={self.token!r}, children={self.children!r}, is_quoted={self.is_quoted!r})"
 
     def __str__(self) -> str:
         if self.token.type in t.atoms:
@@ -27,39 +36,67 @@ class Node:
 
 
 # prefix, infix, infix_right_assoc get populated further down
-prefix: Dict[str, Tuple[Callable[[t.TokenStream, int], Node], int]] = {}
-infix: Dict[str, Tuple[Callable[[t.TokenStream, int, Node], Node], int]] = {}
+prefix: Dict[str, Tuple[Callable[[t.TokenStream, int], Rule], int]] = {}
+infix: Dict[str, Tuple[Callable[[t.TokenStream, int, Node], Rule], int]] = {}
 infix_right_assoc: Set[str] = set()
 
 
-def parse(token_stream: t.TokenStream, rbp: int = 0) -> Node:
-    f, _bp = prefix.get(token_stream.current.type, (raise_unexpected_error, HIGH_PREC))
-    node = f(token_stream, _bp)
-    return _parse_infix(token_stream, rbp, node)
-
+Rule = Union[Node, Generator[int, Node, Node]]
 
-def _parse_infix(token_stream: t.TokenStream, rbp: int, node: Node) -> Node:
-    f, _lbp = infix.get(token_stream.current.type, (raise_unexpected_error, HIGH_PREC))
-    _rbp = _lbp - 1 if token_stream.current.type in infix_right_assoc else _lbp
 
-    if rbp >= _lbp:
-        return node
+def parse(token_stream: t.TokenStream, rbp: int = 0) -> Node:
+    """Pratt parse an expression without recursing.
 
-    return _parse_infix(token_stream, rbp, f(token_stream, _rbp, node))
+    Rules either return a Node or are generators that yield the binding power
+    of each sub-expression they need and are sent back the parsed Node. Each
+    expression on the stack is [rbp, rule], its rule is replaced by an infix
+    rule for as long as the next token binds tighter than rbp.
+    """
+    stack: List[List[Any]] = [[rbp, _prefix(token_stream)]]
+    node: Optional[Node] = None
+    while True:
+        expression = stack[-1]
+        rule = expression[1]
+        if not isinstance(rule, Node):
+            try:
+                stack.append([rule.send(node), None])
+                stack[-1][1] = _prefix(token_stream)
+                node = None
+                continue
+            except StopIteration as stop:
+                rule = stop.value
+        node = rule
+
+        f, _lbp = infix.get(token_stream.current.type, (raise_unexpected_error, HIGH_PREC))
+        if expression[0] >= _lbp:
+            stack.pop()
+            if not stack:
+                return node
+            continue
+        _rbp = _lbp - 1 if token_stream.current.type in infix_right_assoc else _lbp
+        expression[1] = f(token_stream, _rbp, node)
+        node = None
+
+
+def _prefix(token_stream: t.TokenStream) -> Rule:
+    f, _bp = prefix.get(token_stream.current.type, (raise_unexpected_error, HIGH_PREC))
+    return f(token_stream, _bp)
 
 
 def parse_statements(token_stream: t.TokenStream) -> Iterator[Node]:
     while token_stream.current.type != t.eof:
         node = parse(token_stream)
-        convert_children(Node(replace(t._void_token, type="statement"), [node]))
+        convert_children(Node(_statement_token, [node]))
         yield node
         if token_stream.current.type == t.eof:
             break
-        prev_lineno = max([c.token.lineno for c in _yield_descendants(node)])
-        if token_stream.current.lineno <= prev_lineno:
+        if token_stream.current.lineno <= token_stream.previous.lineno:
             raise ParseError("expected statements to be on separate lines", token_stream.current)
 
 
+_statement_token = t._void_token.with_type("statement")
+
+
 def eat(token_stream: t.TokenStream, token_type: str) -> None:
     """Assert the value of the current token, then move to the next token."""
     token = token_stream.current
@@ -73,12 +110,12 @@ def prefix_atom(token_stream: t.TokenStream, bp: int) -> Node:
     return Node(before, [])
 
 
-def prefix_unary(token_stream: t.TokenStream, bp: int) -> Node:
+def prefix_unary(token_stream: t.TokenStream, bp: int) -> Rule:
     before, _ = token_stream.current, token_stream.advance()
-    return Node(before, [parse(token_stream, bp)])
+    return convert_children(Node(before, [(yield bp)]))
 
 
-def infix_binary(token_stream: t.TokenStream, rbp: int, left: Node) -> Node:
+def infix_binary(token_stream: t.TokenStream, rbp: int, left: Node) -> Rule:
     """a === b becomes (=== a b)"""
     before = token_stream.current
 
@@ -87,43 +124,43 @@ def infix_binary(token_stream: t.TokenStream, rbp: int, left: Node) -> Node:
         # a => [1, 2] becomes (=> (* a) '([ 1 2))
         if left.token.type == t.name:
             left = Node(left.token, [left])
-        left.token = replace(left.token, type=t.many)
+        left.token = left.token.with_type(t.many)
 
     if before.type == "(":
         # in the case of ( as a infix binary operator, eg:
         # f(1, 2, 3) becomes ($ f (* 1 2 3))
-        before = replace(before, type=t.apply)
-        right = parse(token_stream, rbp)
-        right.token = replace(right.token, type=t.many)
+        before = before.with_type(t.apply)
+        right = yield rbp
+        right.token = right.token.with_type(t.many)
     else:
         token_stream.advance()
-        right = parse(token_stream, rbp)
+        right = yield rbp
 
     if before.type == "=>":
         right.is_quoted = True
 
-    return Node(before, [left, right])
+    return convert_children(Node(before, [left, right]))
 
 
-def infix_ternary(token_stream: t.TokenStream, rbp: int, left: Node) -> Node:
+def infix_ternary(token_stream: t.TokenStream, rbp: int, left: Node) -> Rule:
     """a > 1 ? x : y becomes (? (> a 1) x y)"""
     before, _ = token_stream.current, token_stream.advance()
-    true_expr = parse(token_stream, COLON_PREC)
+    true_expr = yield COLON_PREC
     eat(token_stream, ":")
-    false_expr = parse(token_stream, rbp)
+    false_expr = yield rbp
     children = [left, true_expr, false_expr]
     true_expr.is_quoted = True
     false_expr.is_quoted = True
-    return Node(before, children)
+    return convert_children(Node(before, children))
 
 
-def prefix_variadic(token_stream: t.TokenStream, bp: int) -> Node:
+def prefix_variadic(token_stream: t.TokenStream, bp: int) -> Rule:
     """{a: 1, ...x} becomes ({ (: a 1) (... x))"""
     before, _ = token_stream.current, token_stream.advance()
     end = {"[": "]", "{": "}", "(": ")"}[before.type]
     children = []
     while token_stream.current.type != end:
-        child = parse(token_stream, LOW_PREC)
+        child = yield LOW_PREC
         children.append(child)
         if token_stream.current.type != end:
             eat(token_stream, ",")
@@ -131,19 +168,19 @@ def prefix_variadic(token_stream: t.TokenStream, bp: int) -> Node:
     return Node(before, children)
 
 
-def prefix_variadic_template(token_stream: t.TokenStream, bp: int) -> Node:
+def prefix_variadic_template(token_stream: t.TokenStream, bp: int) -> Rule:
     """`foo ${a} ${[1, 2]} bar` becomes (` `foo ${ a } ${ ([1 2) } bar`)
 
     Templates are a bit weird in that Token("`foo ${") appears twice -
     as the operator and as a piece of template data.
     """
     before, _ = token_stream.current, token_stream.advance()
-    children = [Node(replace(before, type=t.template), [])]
+    children = [Node(before.with_type(t.template), [])]
     if not before.value.endswith("`"):
         while not token_stream.current.value.endswith("`"):
-            children.append(parse(token_stream, bp))
-        children.append(parse(token_stream, bp))
-    return Node(before, children)
+            children.append((yield bp))
+        children.append((yield bp))
+    return convert_children(Node(before, children))
 
 
 def raise_unexpected_error(token_stream: t.TokenStream, *_: int) -> Node:
@@ -224,21 +261,43 @@ children_types = {
     t.d_many: ({t.name: t.d_name, "[": t.d_brack}, ...),
 }
 
+# these might yet be retagged by their parent, eg: ( to * in f(a, b), so their
+# children are checked when their parent's are, rather than when they're parsed
+_checked_by_parent = {"(", "[", "{", t.many}
+
+
 def convert_children(node: Node) -> Node:
+    """Check the types of the children of node, retagging them where need be.
+
+    This is done as each node is parsed, so it only descends into children
+    that were still waiting on their parent to settle their type.
+    """
+    stack = [_zip_children_types(node)]
+    while stack:
+        for child, types in stack[-1]:
+            if child.token.type not in types:
+                raise ParseError(
+                    message=f"token is not of type: {' '.join(types)}",
+                    token=child.token,
+                )
+            checked_by_parent = child.token.type in _checked_by_parent
+            if isinstance(types, dict):
+                child.token.type = types[child.token.type]
+            if checked_by_parent:
+                stack.append(_zip_children_types(child))
+                break
+        else:
+            stack.pop()
+    return node
+
+
+def _zip_children_types(node: Node) -> Iterator[Tuple[Node, Any]]:
     ts = children_types[node.token.type]
     if ts and ts[-1] is ...:
         ts = tuple(ts[0] for _ in node.children)
-    assert len(node.children) == len(ts)
-    for child, types in zip(node.children, ts):
-        if child.token.type not in types:
-            raise ParseError(
-                message=f"token is not of type: {' '.join(types)}",
-                token=child.token,
-            )
-        if isinstance(types, dict):
-            child.token.type = types[child.token.type]
-        convert_children(child)
-    return node
+    if len(node.children) != len(ts):  # eg: () or (a, b) not as arguments
+        raise ParseError(f"expected {len(ts)} value(s) got {len(node.children)}", node.token)
+    return zip(node.children, ts)
 
 
 @dataclass
@@ -247,21 +306,11 @@ class ParseError(Exception):
     token: t.Token
 
     def __str__(self) -> str:
-        if isinstance(self.token.filepath, Path):
-            source = self.token.filepath.read_text()
-            filepath = self.token.filepath
-        else:
-            source = t.UUID_SOURCE_MAP[self.token.filepath]
-            filepath = "line"
+        source = "" if self.token.source is None else self.token.source.text
+        filepath = self.token.filepath or "line"
         return dedent(f"""
             <ParserError {filepath}:{self.token.lineno}>
             {self.message}
             {(source + " ").splitlines()[self.token.lineno - 1].rstrip()}
             {"_" * self.token.linepos + "^"}
         """).strip()
-
-
-def _yield_descendants(node: Node) -> Iterator[Node]:
-    yield node
-    for c in node.children:
-        yield from _yield_descendants(c)
@@ -1,23 +1,95 @@
-from dataclasses import dataclass
+from __future__ import annotations
+
+from bisect import bisect_right
+from dataclasses import dataclass, field
 from functools import partial, lru_cache
 from pathlib import Path
-from typing import Dict, Iterator, Optional, Union
+from typing import Any, List, Optional, Tuple
+import re
 from string import ascii_letters, digits
-import uuid
 
 
-@dataclass
+class Source:
+    """The text of a file, or of a string if filepath is None, shared by its tokens."""
+
+    __slots__ = ("text", "filepath", "_line_starts")
+
+    def __init__(self, text: str, filepath: Optional[Path] = None):
+        self.text = text
+        self.filepath = filepath
+        self._line_starts: Optional[List[int]] = None
+
+    def position(self, pos: int) -> Tuple[int, int]:
+        """The (lineno, linepos) of pos, from a table of line starts built on first use."""
+        if self._line_starts is None:
+            self._line_starts = [0, *(m.end() for m in re.finditer("\n", self.text))]
+        lineno = bisect_right(self._line_starts, pos)
+        return lineno, pos - self._line_starts[lineno - 1]
+
+    def __repr__(self) -> str:
+        return f"<Source {self.filepath or 'line'}>"
+
+
 class Token:
-    type: str
-    value: str
-    filepath: Optional[Path]
-    pos: int
-    lineno: int
-    linepos: int
+    """Tokens only store pos, lineno and linepos are looked up in the source when needed."""
+
+    __slots__ = ("type", "value", "source", "pos", "_lineno", "_linepos")
+
+    def __init__(
+        self,
+        type: str,
+        value: str,
+        source: Optional[Source],
+        pos: int,
+        lineno: Optional[int] = None,
+        linepos: Optional[int] = None,
+    ):
+        self.type = type
+        self.value = value
+        self.source = source
+        self.pos = pos
+        self._lineno = lineno
+        self._linepos = linepos
+
+    @property
+    def lineno(self) -> int:
+        if self._lineno is None:
+            self._lineno, self._linepos = self.source.position(self.pos)
+        return self._lineno
+
+    @property
+    def linepos(self) -> int:
+        if self._linepos is None:
+            self._lineno, self._linepos = self.source.position(self.pos)
+        return self._linepos
+
+    @property
+    def filepath(self) -> Optional[Path]:
+        return None if self.source is None else self.source.filepath
+
+    def with_type(self, type: str) -> Token:
+        return Token(type, self.value, self.source, self.pos, self._lineno, self._linepos)
+
+    def _key(self) -> tuple:
+        return (self.type, self.value, self.source, self.pos, self.lineno, self.linepos)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Token):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash((self.type, self.value, self.pos))
+
+    def __repr__(self) -> str:
+        return (
+            f"Token(type={self.type!r}, value={self.value!r}, source={self.source!r}, "
+            f"pos={self.pos!r}, lineno={self.lineno!r}, linepos={self.linepos!r})"
+        )
 
 
 # you should never see this
-_void_token = Token(type="VOID", value="VOID", filepath=None, pos=0, lineno=0, linepos=0)
+_void_token = Token(type="VOID", value="VOID", source=None, pos=0, lineno=0, linepos=0)
 
 # token types
 name, string, number, template, literal = "name", "string", "number", "template", "literal"
@@ -32,50 +104,54 @@ atoms = {name, string, number, template, literal, d_name}
 
 whitespace = set(" \t\f\r")  # note no \n
 _number_begin = set("-" + digits)
-_number_all = set("." + digits)
 _name_begin = set("_" + ascii_letters)
-_name_all = set("_" + ascii_letters + digits)
 _literal_values = ["null", "true", "false"]
 _keyword_values = ["import", "from", "export", "default", "const"]
 _punctuation_values = ["=", "(", ")", "{", "}", "[", "]", ",", ":", ".", "?", "=>", "...", "==="]
 _interim_punctuation_values = ["..", "=="]
+_punctuation_chars = {v for v in _punctuation_values if len(v) == 1}
+_two_char_punctuation = {v for v in _punctuation_values + _interim_punctuation_values if len(v) == 2}
+_three_char_punctuation = {v for v in _punctuation_values if len(v) == 3}
+
+_skip = re.compile(r"(?:[ \t\f\r]+|//[^\n]*)*").match
+_number = re.compile(r"[-0-9][0-9]*(?:\.[0-9]*)?").match
+_name = re.compile(r"[_a-zA-Z][_a-zA-Z0-9]*").match
+_string_body = re.compile(r'(?:[^"\\\n]|\\.)*', re.S).match
+_template_body = re.compile(r"(?:[^`\\$]|\\.|\$(?!\{))*", re.S).match
+_escape = re.compile(r"\\(.)", re.S)
 
 class TokenStreamEmptyError(RuntimeError):
     pass
 
 
-UUID_SOURCE_MAP: Dict[uuid.UUID, str] = {}
-
-
 @dataclass
 class TokenStream:
     # should never raise an error, only return "unexpected" tokens
-    filepath: Union[Path, uuid.UUID]
+    filepath: Optional[Path]
     current: Token = _void_token
+    previous: Token = _void_token
 
-    _source: Optional[str] = None
+    _text: Optional[str] = None
+    _source: Optional[Source] = field(default=None, repr=False)
     _pos: int = 0
-    _lineno: int = 1
-    _linepos: int = 0
     _template_depth: int = 0
 
     @classmethod
     def from_source(cls, source: str):
-        source_uuid = uuid.uuid4()
-        UUID_SOURCE_MAP[source_uuid] = source.rstrip()
-        return cls(filepath=source_uuid)
+        return cls(filepath=None, _text=source.rstrip())
 
     @property
-    def source(self) -> str:
-        if isinstance(self.filepath, uuid.UUID):
-            return UUID_SOURCE_MAP[self.filepath]
+    def source(self) -> Source:
         if self._source is None:
-            self._source = self.filepath.read_text().rstrip()
+            if self._text is None:
+                self._text = self.filepath.read_text().rstrip()
+            self._source = Source(self._text, self.filepath)
         return self._source
 
     def advance(self) -> None:
         if self.current.type == eof:
             return
+        self.previous = self.current
         current = self._read()
         while current.type == "\n":
             current = self._read()
@@ -85,126 +161,79 @@ class TokenStream:
         self.advance()
 
     def __repr__(self) -> str:
-        return f"<TokenStream file:{self.filepath}>"
+        return f"<TokenStream file:{self.filepath or 'line'}>"
 
     def _read(self) -> Token:
-        def char() -> str:
-            if self._pos == len(self.source):
-                return eof
-            return self.source[self._pos]
-
-        def inc() -> None:
-            self._pos += 1
-            self._linepos += 1
-
-        def inc_line() -> None:
-            self._linepos = 0
-            self._lineno += 1
-
-        def gobble():
-            before = char()
-            inc()
-            return before
-
-        def at_comment() -> bool:
-            if self._pos >= len(self.source) - 1:
-                return False
-            return self.source[self._pos] + self.source[self._pos + 1] == "//"
-
-        # eat up whitespace and comments
-        while char() in whitespace or at_comment():
-            if at_comment():
-                inc()
-                inc()
-                while char() not in {"\n", eof}:
-                    inc()
-            else:
-                inc()
-
-        make = partial(Token, pos=self._pos, filepath=self.filepath, lineno=self._lineno, linepos=self._linepos)
-        t = char()
-        inc()
-
-        if t == eof:
+        source = self.source.text
+        pos = _skip(source, self._pos).end()
+        make = partial(Token, pos=pos, source=self.source)
+        if pos >= len(source):
+            self._pos = pos
             return make(eof, eof)
+        t = source[pos]
 
         if t == "\n":
-            inc_line()
+            self._pos = pos + 1
             return make("\n", "\n")
 
         if t == '"':
-            while True:
-                this_char = char()
-                if this_char == eof:
-                    return make(unexpected, t)
-                if this_char == "\n":
-                    t += gobble()
-                    return make(unexpected, t)
-                elif this_char == "\\":
-                    gobble()
-                    t += gobble()
-                elif this_char == '"':
-                    t += gobble()
-                    return make(string, t)
-                else:
-                    t += gobble()
+            body = _string_body(source, pos + 1).group()
+            end = pos + 1 + len(body)
+            value = '"' + _escape.sub(r"\1", body)
+            if end == len(source) or source[end] == "\\":  # unterminated
+                self._pos = len(source)
+                return make(unexpected, value)
+            self._pos = end + 1
+            value += source[end]
+            return make(string if source[end] == '"' else unexpected, value)
 
         if t == "`" or (t == "}" and self._template_depth):
             if t == "`":
                 self._template_depth += 1
-            while True:
-                this_char = char()
-                if this_char == eof:
-                    return make(unexpected, t)
-                if this_char == "\\":
-                    gobble()
-                    t += gobble()
-                elif this_char == "$":
-                    t += gobble()
-                    if char() == "{":
-                        t += gobble()
-                        return make("`" if  t[0] == "`" else template, t)
-                elif this_char == "`":
-                    self._template_depth -= 1
-                    t += gobble()
-                    return make("`" if  t[0] == "`" else template, t)
-                elif this_char == "\n":
-                    inc_line()
-                    t += gobble()
-                else:
-                    t += gobble()
-
-        if t in _punctuation_values:
-            if t + char() in _punctuation_values + _interim_punctuation_values:
-                t += gobble()
-                if t + char() in _punctuation_values:
-                    t += gobble()
-                    return make(t, t)
-                if t in _interim_punctuation_values:
-                    return make(unexpected, t)
-                return make(t, t)
+            body = _template_body(source, pos + 1).group()
+            end = pos + 1 + len(body)
+            if "\\" in body:
+                body = _escape.sub(r"\1", body)
+            if end == len(source) or source[end] == "\\":  # unterminated
+                self._pos = len(source)
+                return make(unexpected, t + body)
+            if source[end] == "`":
+                self._template_depth -= 1
+                close = "`"
+            else:
+                close = "${"
+            self._pos = end + len(close)
+            return make("`" if t == "`" else template, t + body + close)
+
+        if t in _punctuation_chars:
+            two = source[pos:pos + 2]
+            if two in _two_char_punctuation:
+                three = source[pos:pos + 3]
+                if three in _three_char_punctuation:
+                    self._pos = pos + 3
+                    return make(three, three)
+                self._pos = pos + 2
+                return make(unexpected if two in _interim_punctuation_values else two, two)
+            self._pos = pos + 1
             return make(t, t)
 
         if t in _number_begin:
-            seen_decimal_point = False
-            while char() in _number_all:
-                digit = char()
-                inc()
-                if digit == ".":
-                    if seen_decimal_point:
-                        t += digit
-                        return make(unexpected, t)
-                    seen_decimal_point= True
-                t += digit
-            return make(number, t)
+            end = _number(source, pos).end()
+            if source[end:end + 1] == ".":
+                self._pos = end + 1
+                return make(unexpected, source[pos:end + 1])
+            self._pos = end
+            return make(number, source[pos:end])
 
         if t in _name_begin:
-            while char() in _name_all:
-                t += gobble()
+            end = _name(source, pos).end()
+            self._pos = end
+            t = source[pos:end]
             if t in _keyword_values:
                 return make(t, t)
             if t in _literal_values:
                 return make(literal, t)
             return make(name, t)
 
+        self._pos = pos + 1
         return make(unexpected, t)
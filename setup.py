@@ -1,4 +1,5 @@
 from pathlib import Path
+import re
 
 import setuptools
 
@@ -8,9 +9,15 @@ def parse_requirements(filename):
         return [l for l in f.readlines() if l[0] not in ["-", "#"]]
 
 
+def read_version():
+    # dnjs.__version__ is also part of the parse cache key, so keep it the one source
+    text = (Path(__file__).parent / "dnjs" / "__init__.py").read_text()
+    return re.search(r'^__version__ = "([^"]+)"', text, re.M).group(1)
+
+
 setuptools.setup(
     name="dnjs",
-    version="0.0.12",
+    version=read_version(),
     author="Leon Trolski",
     author_email="ojhrussell@gmail.com",
     description="DOM Notation JS",
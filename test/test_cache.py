@@ -0,0 +1,75 @@
+import marshal
+from pathlib import Path
+
+from click.testing import CliRunner
+
+import dnjs
+from dnjs import cache, cli, interpreter
+from dnjs import parser as p
+from dnjs import tokeniser as t
+
+data_dir = Path(__file__).parent / "data"
+
+
+def test_parse_cache(tmp_path, monkeypatch):
+    path = data_dir / "map.dn.js"
+    parse_cache = cache.ParseCache(tmp_path)
+    expected = [str(s) for s in p.parse_statements(t.TokenStream(path))]
+
+    assert [str(s) for s in parse_cache.parse(path)] == expected
+    cache_path = parse_cache.path_for(path)
+    assert cache_path.parent == tmp_path
+    written = cache_path.read_bytes()
+
+    statements = parse_cache.parse(path)
+    assert [str(s) for s in statements] == expected
+    assert statements[0].token.filepath == path
+    assert cache_path.read_bytes() == written
+
+    # more nodes than the tree has room for
+    key = written[:len(cache._key(path.read_text().rstrip()))]
+    cache_path.write_bytes(key + marshal.dumps(((("number", "1", 0, False, 0),) * 2,)))
+    assert [str(s) for s in parse_cache.parse(path)] == expected
+    assert cache_path.read_bytes() == written
+
+    monkeypatch.setattr(dnjs, "__version__", "0.0.0")
+    parse_cache.parse(path)
+    assert cache_path.read_bytes() != written
+
+
+def test_interpret_with_parse_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "parse_cache", cache.ParseCache(tmp_path))
+    actual = interpreter.interpret(data_dir / "thisImports.dn.js").default_export
+    assert actual == {"foo": ["DEFAULT", [{"A": 1}], "B"]}
+    assert len(list(tmp_path.iterdir())) == 2
+    assert interpreter.interpret(data_dir / "thisImports.dn.js").default_export == actual
+
+
+def test_interpret_reads_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "parse_cache", cache.ParseCache(tmp_path / "cache"))
+    path = tmp_path / "page.dn.js"
+    path.write_text("const a = 1\nexport default [a]")
+    reads = []
+    read_text = Path.read_text
+    monkeypatch.setattr(Path, "read_text", lambda self: reads.append(self) or read_text(self))
+    assert interpreter.interpret(path).default_export == [1]
+    assert reads == [path]
+
+
+def test_warm_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "parse_cache", None)
+    (tmp_path / "src" / "nested").mkdir(parents=True)
+    (tmp_path / "src" / "a.dn.js").write_text("export default 1")
+    (tmp_path / "src" / "nested" / "b.dn.js").write_text("export default 2")
+    result = CliRunner().invoke(cli.main, ["--warm-cache", str(tmp_path / "src")])
+    assert result.exit_code == 0
+
+    # a broken file is reported, and the rest are still cached
+    (tmp_path / "src" / "a.dn.js").write_text("export default (")
+    (tmp_path / "src" / "c.dn.js").write_text("export default 3")
+    result = CliRunner().invoke(cli.main, ["--warm-cache", str(tmp_path / "src")])
+    assert result.exit_code == 1
+    assert str(tmp_path / "src" / "a.dn.js") in result.output
+    assert (tmp_path / "src" / cache.CACHE_DIRNAME / ("c.dn.js" + cache.SUFFIX)).exists()
+    assert (tmp_path / "src" / cache.CACHE_DIRNAME / ("a.dn.js" + cache.SUFFIX)).exists()
+    assert (tmp_path / "src" / "nested" / cache.CACHE_DIRNAME / ("b.dn.js" + cache.SUFFIX)).exists()
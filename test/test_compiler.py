@@ -0,0 +1,158 @@
+import copy
+from pathlib import Path
+
+import pytest
+
+from dnjs import builtins, html, interpreter
+from dnjs import parser as p
+
+data_dir = Path(__file__).parent / "data"
+paths = sorted(p for p in data_dir.glob("*.dn.js") if p.name != "simple.dn.js")  # tokeniser only
+
+
+def js(module: interpreter.Module):
+    values = [module.exports, module.default_export, module.value]
+    return html.make_value_js_friendly([None if v is interpreter.missing else v for v in values])
+
+
+@pytest.mark.parametrize("path", paths, ids=[path.name for path in paths])
+def test_same_as_tree_walking(path):
+    assert js(interpreter.interpret(path)) == js(interpreter.interpret(path, compiled=False))
+
+
+def test_functions():
+    module = interpreter.interpret(source="""
+        const a = 1
+        const f = (a, [b, c]) => [a, b, c, (d) => [a, d]]
+        export default f
+    """)
+    f = module.default_export
+    assert f.arg_names == ["a", ["b", "c"]]
+    x = f(2, [3, 4])
+    assert x[:3] == [2, 3, 4]
+    assert x[3](5) == [2, 5]
+
+
+def test_constant_folding():
+    module = interpreter.interpret(source="""
+        const f = (a) => [m("p.a", {id: "x"}, "hi"), {b: [1, 2]}, dedent(`
+            c`), a]
+        export default f
+    """)
+    first, second = module.default_export(1), module.default_export(2)
+    assert first[0] is second[0]
+    assert first[1] is second[1]
+    assert first[2] == "c"
+    assert first[3] == 1
+    with pytest.raises(TypeError):
+        first[1]["b"].append(3)
+    assert copy.deepcopy(first[1]) == {"b": [1, 2]}
+
+
+def test_shadowed_builtin():
+    module = interpreter.interpret(source="""
+        const f = () => m("p")
+        const m = (a) => a
+        export default f
+    """)
+    assert module.default_export() == "p"
+
+
+def test_reduce_in_place():
+    module = interpreter.interpret(source="""
+        const init = [0]
+        export const flatten = (xs) => xs.reduce((a, b) => [...a, ...b], init)
+        export const merge = (xs) => xs.reduce((a, b) => ({...a, ...b, n: 1}), {})
+        export const lengths = (xs) => xs.reduce((a, b) => [...a, a.length], [])
+        export const bad = (xs) => xs.reduce((a, b) => [...a, b], {})
+    """)
+    flatten, merge, lengths, bad = [module.exports[k] for k in ["flatten", "merge", "lengths", "bad"]]
+    assert flatten([[1, 2], [3]]) == [0, 1, 2, 3]
+    assert flatten([[4]]) == [0, 4]
+    assert module.scope["init"] == [0]
+    assert merge([{"a": 1}, {"b": 2}]) == {"a": 1, "b": 2, "n": 1}
+    assert lengths([5, 5, 5]) == [0, 1, 2]
+    with pytest.raises(p.ParseError) as e:
+        bad([1])
+    assert e.value.message == "must be of type: ["
+
+
+@pytest.mark.parametrize("expression", [
+    "xs.filter((x) => x === 1)",
+    "xs.filter((x, i) => i === 1).map((x, i) => [x, i])",
+    "xs.map((x, i) => [x, i]).filter((x, i) => i === 0)",
+    "xs.map((x) => x).map((x) => [x])",
+    "xs.filter((x) => x === 2).length",
+    "xs.map((x) => [x]).length",
+    "xs.map((x) => x).includes(3)",
+    "xs.filter((x) => x === 3).includes(1)",
+    "xs.map((x) => [x]).reduce((a, b) => [...a, ...b], [])",
+    "Object.entries(o).map(([k, v]) => v)",
+    "Object.entries(o).filter(([k, v]) => k === \"b\").length",
+    "o.map((x) => x)",
+    "o.items.map((x) => [x]).filter((x) => x).length",
+])
+def test_pipelines(expression):
+    source = f"""
+        const o = {{a: 1, b: 2, items: [1, 2], map: (f) => f(\"m\")}}
+        export default (xs) => {expression}
+    """
+    walked = interpreter.interpret(source=source, compiled=False).default_export([1, 2, 3])
+    compiled = interpreter.interpret(source=source).default_export([1, 2, 3])
+    assert html.make_value_js_friendly(compiled) == html.make_value_js_friendly(walked)
+
+
+def test_inline_caches():
+    module = interpreter.interpret(source="""
+        const constant = [1, 2]
+        export default (x) => [x.length, x.map, x.includes(2), constant.includes(x.a), m.trust("<b>")]
+    """)
+    f = module.default_export
+    for _ in range(2):  # a second time from the caches
+        length, _, includes, constant_includes, _ = f([2])
+        assert (length, includes, constant_includes) == (1, True, False)
+        assert f({"length": 3, "includes": lambda v: v, "a": 1})[:4] == [3, builtins.undefined, 2, True]
+        assert f([1])[1](lambda v, i: v + i) == [1]
+        assert f([])[4] == builtins.TrustedHtml("<b>")
+    with pytest.raises(p.ParseError) as e:
+        f(builtins.undefined)
+    assert e.value.message == "cannot get .length, value is undefined"
+
+
+def test_pipelines_are_lazy():
+    module = interpreter.interpret(source="""
+        export const length = (xs) => xs.map((x) => x.a.b).length
+        export const includes = (xs) => xs.map((x) => x.a.b).includes(1)
+    """)
+    assert module.exports["length"]([{}, {}]) == 2
+    assert module.exports["includes"]([{"a": {"b": 1}}, {}]) is True
+
+
+def test_tree_walking_scopes():
+    module = interpreter.interpret(source="""
+        const a = 1
+        const f = (a) => ((b) => [a, b, c])
+        const c = 3
+        export default f
+    """, compiled=False)
+    g = module.default_export(2)
+    assert g(4) == [2, 4, 3]
+    assert "b" not in module.scope
+
+
+def test_unbound_argument():
+    module = interpreter.interpret(source="export default (a, b) => b")
+    with pytest.raises(p.ParseError) as e:
+        module.default_export(1)
+    assert e.value.message == "variable b is not in scope"
+
+
+@pytest.mark.parametrize("compiled", [True, False])
+def test_unbound_argument_falls_through(compiled):
+    module = interpreter.interpret(source="""
+        const x = 1
+        const f = (x) => x
+        const g = (x) => ((y, x) => x)
+        export default [f(), f(2), g(3)(4), g()(4)]
+    """, compiled=compiled)
+    assert module.default_export == [1, 2, 3, 1]
@@ -1,11 +1,22 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+import io
+import json
+import sys
+import threading
 from pathlib import Path
 from textwrap import dedent
 from typing import Any, List
 
-from dnjs import render
+from click.testing import CliRunner
+import pytest
+
+from dnjs import builtins, cli, get_default_export, html, interpreter, render, render_async, render_many
+from dnjs.builtins import m
 
 data_dir = Path(__file__).parent / "data"
+EXAMPLES = Path(__file__).parent.parent / "examples"
 
 ctx = {
     "route_args": [],
@@ -64,3 +75,135 @@ def test_interperet():
 def test_interperet_dataclass():
     actual = render(data_dir / "account.dn.js", dataclass_ctx)
     assert actual == expected
+
+
+def test_deep_html():
+    depth = sys.getrecursionlimit() * 2
+    value = "leaf"
+    for _ in range(depth):
+        value = {"tag": "div", "attrs": {"className": ""}, "children": [value]}
+    actual = html.to_html(html.make_value_js_friendly(value))
+    assert actual.startswith("<div>\n    <div>\n")
+    assert "\n" + "    " * depth + "leaf\n" in actual
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_render_many(ordered):
+    members = [{**ctx, "members": [{"name": f"Oli{i}"}]} for i in range(10)] + [dataclass_ctx]
+    expected_many = [render(data_dir / "account.dn.js", m) for m in members]
+    actual = render_many(data_dir / "account.dn.js", ((m,) for m in members), workers=2, chunksize=3, ordered=ordered)
+    actual = list(actual)
+    assert actual == expected_many if ordered else sorted(actual) == sorted(expected_many)
+
+
+def test_render_threads():
+    interpreter.module_cache.clear()
+    contexts = [{**ctx, "members": [{"name": f"Oli{i}"}]} for i in range(64)]
+    barrier = threading.Barrier(16)
+
+    def worker(i):
+        if i < 16:
+            barrier.wait(timeout=10)  # load the module from 16 threads at once
+        return render(data_dir / "account.dn.js", contexts[i])
+
+    with ThreadPoolExecutor(16) as executor:
+        actual = list(executor.map(worker, range(len(contexts))))
+    assert actual == [render(data_dir / "account.dn.js", c) for c in contexts]
+
+
+def test_render_async():
+    async def collect(chunk_size):
+        return [c async for c in render_async(data_dir / "account.dn.js", ctx, chunk_size=chunk_size)]
+
+    chunks = asyncio.run(collect(chunk_size=4))
+    assert len(chunks) > 1
+    assert "".join(chunks) == expected
+    assert asyncio.run(collect(chunk_size=10_000)) == [expected]
+
+    async def interleaved():
+        ticks = []
+        async for _ in render_async(data_dir / "account.dn.js", ctx, chunk_size=4):
+            ticks.append(len(ticked))
+        return ticks
+
+    async def ticker():
+        while True:
+            ticked.append(None)
+            await asyncio.sleep(0)
+
+    async def main():
+        task = asyncio.ensure_future(ticker())
+        ticks = await interleaved()
+        task.cancel()
+        return ticks
+
+    ticked: List[None] = []
+    ticks = asyncio.run(main())
+    assert ticks == sorted(ticks) and len(set(ticks)) == len(ticks)  # the ticker ran between chunks
+
+
+def test_iter_html():
+    value = html.make_value_js_friendly(get_default_export(data_dir / "account.dn.js")(ctx))
+    for chunk_size in [None, 1, 3, 1000]:
+        assert "".join(html.iter_html(value, chunk_size=chunk_size)) == expected
+    assert len(list(html.iter_html(value, chunk_size=1))) > 10
+    assert "".join(html.iter_html("a & b", indent=2)) == html.to_html("a & b", indent=2)
+    assert list(html.iter_html(None)) == []
+
+    out = io.StringIO()
+    html.write_html(value, out, chunk_size=5)
+    assert out.getvalue() == expected
+
+
+def test_cli_html():
+    result = CliRunner().invoke(cli.main, ["--html", str(EXAMPLES / "commentsPage.dn.js"), str(EXAMPLES / "comments.json")])
+    assert result.exit_code == 0
+    comments = json.loads((EXAMPLES / "comments.json").read_text())
+    assert result.output == render(EXAMPLES / "commentsPage.dn.js", comments) + "\n"
+
+
+def test_to_html_names():
+    value = {"tag": "a<b", "attrs": {"className": "", "x\"y": "1", "data-n": 2, "on": True, "off": False}, "children": []}
+    assert html.to_html(value) == '<a&lt;b x&quot;y="1" data-n="2" on>\n\n</a&lt;b>\n'
+    assert html.to_html({"tag": "className", "attrs": {"className": "c"}, "children": []}) == (
+        '<className class="c">\n\n</className>\n'
+    )
+    with pytest.raises(AssertionError):
+        html.to_html({"tag": "p"})
+
+
+def test_compact():
+    value = m(
+        "div.a",
+        m("p", {"class": []}, "hi & bye"),
+        m("br"),
+        m("input", {"checked": True, "disabled": False}),
+        m("pre", "x\n  y", m("b", "z")),
+    )
+    assert html.to_html(value, compact=True) == (
+        '<div class="a"><p>hi &amp; bye</p><br><input checked><pre>x\n  y<b>\n    z\n</b>\n</pre></div>'
+    )
+    assert "".join(html.iter_html(value, chunk_size=1, compact=True)) == html.to_html(value, compact=True)
+
+    compact = render(data_dir / "account.dn.js", ctx, compact=True)
+    assert "\n    " not in compact and len(compact) < len(expected)
+    result = CliRunner().invoke(cli.main, ["--html", "--compact", str(EXAMPLES / "commentsPage.dn.js"), str(EXAMPLES / "comments.json")])
+    comments = json.loads((EXAMPLES / "comments.json").read_text())
+    assert result.output == render(EXAMPLES / "commentsPage.dn.js", comments, compact=True) + "\n"
+
+
+def test_static_nodes():
+    template = interpreter.interpret(source="""
+        const nav = m("nav", m("a", {href: "/"}, "home"), m("pre", "a\\n b"))
+        export default (title) => m("body", nav, m("h1", title), m("ul", m("li", "static")))
+    """).default_export
+    page = template("x & y")
+    nav, _, ul = page["children"]
+    assert type(nav) is builtins.StaticNode and type(ul) is builtins.StaticNode
+    plain = builtins.thaw(page)
+    for compact in [False, True]:
+        assert html.to_html(page, compact=compact) == html.to_html(plain, compact=compact)
+        assert html.to_html(page, indent=3, compact=compact) == html.to_html(plain, indent=3, compact=compact)
+    assert set(nav.rendered) == {1, 4, None}
+    assert "".join(html.iter_html(page, chunk_size=1)) == html.to_html(plain)
+    assert html.make_value_js_friendly(page)["children"][0] is nav
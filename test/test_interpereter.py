@@ -1,10 +1,14 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import threading
 from pathlib import Path
 from textwrap import dedent
 from typing import Union
 
 import pytest
 
-from dnjs import interpreter
+from dnjs import cache, data, interpreter
 from dnjs import parser as p
 from dnjs import get_default_export, get_named_export
 
@@ -121,3 +125,261 @@ def test_scope_error():
         export default bar
         _______________^
     """).strip().splitlines()
+
+
+def test_module_cache(tmp_path):
+    base = tmp_path / "base.dn.js"
+    page = tmp_path / "page.dn.js"
+    other = tmp_path / "other.dn.js"
+    base.write_text('export const a = 1')
+    page.write_text('import { a } from "./base.dn.js"\nexport default [a]')
+    other.write_text('export default 2')
+
+    cache = interpreter.ModuleCache(maxsize=2)
+    module = cache.get(page)
+    assert module.default_export == [1]
+    assert cache.get(page) is module
+    assert base in cache
+
+    base.write_text('export const a = 11')
+    assert cache.get(page).default_export == [11]
+
+    # touching without changing the content keeps the entry
+    module = cache.get(page)
+    os.utime(base, ns=(0, 0))
+    assert cache.get(page) is module
+
+    # least recently used entries, and anything importing them, get evicted
+    cache.get(other)
+    assert base not in cache
+    assert page not in cache
+    assert len(cache) == 1
+
+
+def test_diamond_imports(tmp_path):
+    (tmp_path / "shared.dn.js").write_text('export const a = [1]')
+    (tmp_path / "b.dn.js").write_text('import { a } from "./shared.dn.js"\nexport default a')
+    (tmp_path / "c.dn.js").write_text('import { a } from "./shared.dn.js"\nexport default a')
+    (tmp_path / "top.dn.js").write_text(dedent("""
+        import b from "./b.dn.js"
+        import c from "./c.dn.js"
+        export default [b, c]
+    """))
+    b, c = interpreter.interpret(tmp_path / "top.dn.js").default_export
+    assert b is c
+
+
+def test_circular_import(tmp_path):
+    (tmp_path / "a.dn.js").write_text('import b from "./b.dn.js"\nexport default b')
+    (tmp_path / "b.dn.js").write_text('import a from "./a.dn.js"\nexport default a')
+    for load in [interpreter.interpret, interpreter.ModuleCache().get]:
+        with pytest.raises(p.ParseError) as e:
+            load(tmp_path / "a.dn.js")
+        assert e.value.message == "circular import: a.dn.js -> b.dn.js -> a.dn.js"
+
+
+@pytest.mark.parametrize("source", [
+    'export default {"a": [1]}',  # read as data
+    'const x = 1\nexport default {a: [x]}',
+    'export default {...{a: [1]}}',  # folded
+])
+def test_exports_are_plain(tmp_path, source):
+    path = tmp_path / "page.dn.js"
+    path.write_text(source)
+    value = get_default_export(path)
+    assert type(value) is dict and type(value["a"]) is list
+
+
+def test_lazy_modules(tmp_path):
+    (tmp_path / "base.dn.js").write_text(dedent("""
+        export const a = 1
+        export const broken = [...a]
+    """))
+    path = tmp_path / "page.dn.js"
+    path.write_text(dedent("""
+        import { a, broken } from "./base.dn.js"
+        const early = () => late
+        export const b = early()
+        export const d = m("p").tag
+        const m = (x) => x
+        const late = [a, m("p")]
+        export const c = late
+        const f = (x) => [x, missing]
+        export default broken
+    """))
+    for compiled in [True, False]:
+        module = interpreter.interpret(path, compiled=compiled, lazy=True)
+        assert module.exports["c"] == [1, "p"]
+        with pytest.raises(p.ParseError) as e:
+            module.exports["b"]  # as when evaluating in order, late isn't in scope yet
+        assert e.value.message == "variable late is not in scope"
+        assert module.scope["early"]() == [1, "p"]
+        assert module.exports["d"] == "p"
+        with pytest.raises(p.ParseError) as e:
+            module.default_export
+        assert e.value.message == "must be of type: ["
+
+    assert get_named_export(path, "c") == [1, "p"]
+    assert interpreter.lazy_module_cache.get(path).exports["c"] == get_named_export(path, "c")
+
+
+def test_exports_are_copies(tmp_path):
+    path = tmp_path / "page.dn.js"
+    path.write_text(dedent("""
+        const x = 1
+        export const a = {b: [1]}
+        export const f = (y) => [{c: [x, y]}, a]
+        export default {a: [x]}
+    """))
+    value = get_default_export(path)
+    value["a"].append(99)
+    value["b"] = 2
+    assert get_default_export(path) == {"a": [1]}
+
+    for a in [get_named_export(path, "a"), get_named_export(path, "f")(2)[1]]:
+        assert type(a) is dict and type(a["b"]) is list
+        a["b"].append(2)
+    assert get_named_export(path, "f")(2) == [{"c": [1, 2]}, {"b": [1]}]
+
+
+def test_lazy_modules_threads(tmp_path):
+    path = tmp_path / "page.dn.js"
+    path.write_text(dedent("""
+        const early = () => late
+        const xs = XS
+        export const slow = xs.map((x) => xs.map((y) => [x, y]))
+        const late = 1
+        export const c = late
+    """).replace("XS", str(list(range(300)))))
+    for _ in range(5):
+        module = interpreter.interpret(path, lazy=True)
+        barrier = threading.Barrier(8)
+
+        def worker(i):
+            barrier.wait(timeout=10)
+            return module.exports["slow"] if i % 2 else module.scope["early"]()
+
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(worker, range(8)))
+        assert results[0::2] == [1] * 4
+        assert all(r is results[1] for r in results[1::2])  # evaluated once
+
+
+def test_module_cache_threads(tmp_path, monkeypatch):
+    slow, fast = tmp_path / "slow.dn.js", tmp_path / "fast.dn.js"
+    slow.write_text("export default 1")
+    fast.write_text("export default 2")
+    cache = interpreter.ModuleCache()
+    cache.get(fast)
+
+    loading, done = threading.Event(), threading.Event()
+    digest = interpreter._digest
+
+    def slow_digest(path):
+        if path.name == "slow.dn.js":
+            loading.set()
+            done.wait(timeout=10)
+        return digest(path)
+
+    monkeypatch.setattr(interpreter, "_digest", slow_digest)
+    with ThreadPoolExecutor(2) as executor:
+        first, second = executor.submit(cache.get, slow), executor.submit(cache.get, slow)
+        assert loading.wait(timeout=10)
+        assert cache.get(fast).default_export == 2  # not blocked by loading slow
+        done.set()
+        assert first.result() is second.result()
+
+
+def test_circular_import_threads(tmp_path, monkeypatch):
+    (tmp_path / "a.dn.js").write_text('import b from "./b.dn.js"\nexport default b')
+    (tmp_path / "b.dn.js").write_text('import a from "./a.dn.js"\nexport default a')
+    cache = interpreter.ModuleCache()
+    barrier = threading.Barrier(2)
+    digest = interpreter._digest
+
+    seen = set()
+
+    def both_loading(path):
+        if path.name not in seen:  # each thread holds one file, then imports the other
+            seen.add(path.name)
+            barrier.wait(timeout=10)
+        return digest(path)
+
+    monkeypatch.setattr(interpreter, "_digest", both_loading)
+    with ThreadPoolExecutor(2) as executor:
+        futures = [executor.submit(cache.get, tmp_path / name) for name in ["a.dn.js", "b.dn.js"]]
+        for future in futures:
+            with pytest.raises(p.ParseError, match="circular import"):
+                future.result(timeout=10)
+
+
+def test_data_modules(tmp_path):
+    path = tmp_path / "data.dn.js"
+    path.write_text(dedent("""
+        // comments and trailing commas are fine
+        export const a = {"b": [1, 2.5, -3, "//", true, null,],}
+        const c = {d: "e"}
+        export default [{"f": 1}]
+    """))
+    module = interpreter.interpret(path)
+    assert module.exports == {"a": {"b": [1, 2.5, -3, "//", True, None]}}
+    assert module.scope["c"] == {"d": "e"}
+    assert module.default_export == [{"f": 1}]
+    assert interpreter.interpret(source='[1.0, 2]').value == [1.0, 2]
+
+    assert data.statements('{"a": 1}\n{"b": 2}') == [("value", None, {"a": 1}), ("value", None, {"b": 2})]
+    assert data.statements('{"a": 1} {"b": 2}') is None
+    assert data.statements('[1e5]') is None
+    assert data.statements('["\\n"]') is None
+    assert data.statements('{null: 1}') is None
+    assert data.statements('[,]') is None
+    assert data.statements('const import = 1') is None
+
+
+def test_deep_data():
+    depth = sys.getrecursionlimit() * 2
+    # the template means this doesn't take the data module shortcut
+    module = interpreter.interpret(source="const t = `t`\n" + "[" * depth + "{a: 1}" + "]" * depth)
+    value = module.value
+    for _ in range(depth):
+        value, = value
+    assert value == {"a": 1}
+
+
+def test_duplicate_keys():
+    source = '{"a": [], "b": 2, "a": 1}'
+    expected = {"a": 1, "b": 2}
+    assert data.statements(source) == [("value", None, expected)]
+    # the template means these don't take the data module shortcut
+    for compiled in [True, False]:
+        value = interpreter.interpret(source="const t = `t`\n" + source, compiled=compiled).value
+        assert value == expected
+        assert list(value) == ["a", "b"]
+
+
+@pytest.mark.parametrize("compiled", [True, False])
+def test_deep_expressions(compiled, tmp_path, monkeypatch):
+    depth = sys.getrecursionlimit()
+    path = tmp_path / "deep.dn.js"
+    path.write_text(dedent(f"""
+        const x = 1
+        export const nested = {"[" * depth}x{"]" * depth}
+        export const objects = (y) => ({"{a: " * depth}[x, y]{"}" * depth})
+        export const chain = [1]{".map((v) => [v])" * depth}
+    """))
+    parse_cache = cache.ParseCache(tmp_path / "cache")
+    for enabled in [None, parse_cache, parse_cache]:  # the second time reads from the cache
+        monkeypatch.setattr(cache, "parse_cache", enabled)
+        exports = interpreter.interpret(path, compiled=compiled).exports
+        value = exports["nested"]
+        for _ in range(depth):
+            value, = value
+        assert value == 1
+        value = exports["objects"](2)
+        for _ in range(depth):
+            value = value["a"]
+        assert value == [1, 2]
+        value, = exports["chain"]
+        for _ in range(depth):
+            value, = value
+        assert value == 1
@@ -0,0 +1,56 @@
+import pytest
+
+from dnjs import builtins, interpreter, memo
+
+source = """
+export const row = (x) => [x, {n: x}]
+export const rows = (xs) => xs.map((x) => row(x))
+"""
+
+
+@pytest.fixture
+def function_cache():
+    yield memo.enable(maxsize=3)
+    memo.disable()
+
+
+def test_structural_key():
+    key = memo.structural_key
+    assert key((1,)) != key((1.0,)) != key((True,))
+    assert key(({"a": 1, "b": 2},)) != key(({"b": 2, "a": 1},))
+    assert key(([1, [2]],)) == key((builtins.freeze([1, [2]]),))
+    assert key(([[1], 2],)) != key(([[1, 2]],))
+    assert key((builtins.TrustedHtml("<b>"),)) == key((builtins.TrustedHtml("<b>"),))
+    assert key(({1},)) is None
+
+
+def test_function_cache(function_cache):
+    exports = interpreter.interpret(source=source).exports
+    row, rows = exports["row"], exports["rows"]
+
+    first = row(1)
+    assert row(1) is first
+    assert row(1.0) is not first
+    assert function_cache.info() == memo.CacheInfo(hits=1, misses=2, entries=2, bytes=function_cache.bytes)
+    with pytest.raises(TypeError):
+        first.append(2)
+
+    assert rows([1, 2]) == [[1, {"n": 1}], [2, {"n": 2}]]
+    assert len(function_cache) == 3  # evicted row(1.0), the arrow inside .map isn't cached
+    assert rows([1, 2])[0] is first
+
+    assert row({1}) == [{1}, {"n": {1}}]  # unhashable, so not cached
+    assert function_cache.misses == 4
+
+
+def test_maxbytes():
+    function_cache = memo.enable(maxbytes=memo.sizeof(builtins.freeze([1, {"n": 1}])))
+    try:
+        row = interpreter.interpret(source=source).exports["row"]
+        row(1)
+        assert len(function_cache) == 1
+        row(2)
+        assert len(function_cache) == 1
+        assert function_cache.bytes <= function_cache.maxbytes
+    finally:
+        memo.disable()
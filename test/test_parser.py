@@ -1,3 +1,4 @@
+import sys
 from textwrap import dedent
 from unittest.mock import ANY
 
@@ -313,3 +314,11 @@ def test_assign_ternary():
 
     text = "() => g(a, [f(b => a === 1)])"
     assert parse(text) == "(=> (d*) '($ g (* a ([ ($ f (* (=> (d* b) '(=== a 1))))))))"
+
+
+def test_deep_nesting():
+    depth = sys.getrecursionlimit() * 2
+    statement, = p.parse_statements(t.TokenStream.from_source("[" * depth + "]" * depth))
+    assert statement.token.type == "["
+    statement, = p.parse_statements(t.TokenStream.from_source("a" + ".map(f)" * depth))
+    assert statement.token.type == t.apply
@@ -109,6 +109,10 @@ def test_line_numbers():
     assert eat() == t.Token(t.number, "8", ANY, 8, 4, 0)
     assert eat().type == t.eof
 
+    reader = t.TokenStream.from_source("`a\n${b}`")
+    assert eat() == t.Token("`", "`a\n${", ANY, 0, 1, 0)
+    assert eat() == t.Token(t.name, "b", ANY, 5, 2, 2)
+
 
 def test_combined():
     assert l(".12.6") == [(".", "."), (t.number, "12.6")]
@@ -144,3 +148,13 @@ def test_comments():
         ('}', '}'),
     ]
     assert l(text) == expected
+
+
+def test_source():
+    reader = t.TokenStream.from_source("foo\nbar")
+    token = reader.current
+    assert token.source.text == "foo\nbar"
+    assert token.filepath is None
+    reader.advance()
+    assert reader.current.source is token.source
+    assert not hasattr(t, "UUID_SOURCE_MAP")